@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Reads several data folders at once, e.g. a baseline and the branches
+compared against it, so the time taken is close to that of the slowest
+folder rather than the sum of all of them.
+
+The folders usually sit on network shares where waiting for the bytes of a
+file takes longer than parsing them.  Listing the folders, reading files and
+the cache go through a pool of threads, with at most max_open files in
+flight at a time.  Each file is parsed from its path by the same threads or,
+with n_workers other than 1, by worker processes given only the path, so a
+file is streamed chunksize rows at a time rather than held whole in memory.
+Capture files (capture_file.py) are mapped and viewed in place.
+
+    from async_read import read_folders
+    sweeps = read_folders(['test_data_7_good', 'test_data'])
+    sensitivities(sweeps['test_data'])
+
+From code already running an event loop, e.g. a notebook, await
+read_folders_async instead.
+"""
+import asyncio
+import warnings
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from summarize_data import ber_data_reader, sweep_collection
+from instrument import profiler, init_worker
+
+def _parse(reader, file_name, in_worker):
+    '''
+    Parses file_name from its path, returning (data_obj, error, stage
+    timings) as ber_data_reader._read_one.  Timings are only handed back
+    from worker processes, threads record them directly.
+    '''
+    try:
+        data_obj, error = reader._read_pandas(file_name), None
+    except Exception as err:
+        data_obj, error = None, f'{type(err).__name__}: {err}'
+    return data_obj, error, profiler.drain() if in_worker else None
+
+async def _read_file(reader, file_name, limit, io_pool, parse_pool):
+    '''
+    Reads one file of reader's folder from its cache or by parsing it,
+    holding one of the limit slots until done so only a bounded number of
+    files is open at once.
+    '''
+    loop = asyncio.get_running_loop()
+    async with limit:
+        try:
+            data_obj = await loop.run_in_executor(io_pool, reader._load_cache, file_name) if reader.cache else None
+            if data_obj is not None:
+                return data_obj, None, None
+        except OSError as err:
+            return None, f'{type(err).__name__}: {err}', None
+
+        result = await loop.run_in_executor(parse_pool, _parse, reader, file_name, parse_pool is not io_pool)
+        if reader.cache and result[0] is not None:
+            await loop.run_in_executor(io_pool, reader._save_cache, file_name, result[0])
+        return result
+
+async def _read_folder(reader, limit, io_pool, parse_pool):
+    '''
+    Reads all the CSV files of reader's folder, returning them as a
+    sweep_collection and keeping the failures in reader.read_errors as
+    ber_data_reader.read does.
+    '''
+    loop = asyncio.get_running_loop()
+    files = await loop.run_in_executor(io_pool, reader._capture_files)
+    results = await asyncio.gather(*[_read_file(reader, file_name, limit, io_pool, parse_pool) for file_name in files])
+
+    reader.read_errors = dict()
+    all_data = []
+    for file_name, (data_obj, error, records) in zip(files, results):
+        profiler.merge(records)
+        if error is None:
+            all_data += [data_obj]
+        else:
+            reader.read_errors[file_name] = error
+            warnings.warn(f'Could not read {reader.folder_name}/{file_name}: {error}')
+    return sweep_collection(all_data)
+
+async def read_folders_async(folders, max_open=16, n_workers=1, reader=ber_data_reader, **reader_args):
+    '''
+    Reads all the CSV files of each folder in folders concurrently.
+
+    parameters
+    ----------
+
+    folders: list of str
+        Data folders, as given to ber_data_reader
+
+    max_open: int
+        Most files being read or parsed at a time over all folders, which
+        bounds the requests in flight to a share
+
+    n_workers: int or None
+        1 parses in the threads reading the files, which suits slow shares;
+        otherwise the number of worker processes parsing, None for one per
+        CPU.  With worker processes on Windows, the calling script must be
+        guarded by if __name__ == '__main__'.
+
+    reader: class
+        ber_data_reader or a reader derived from it, e.g. timing_reader
+
+    reader_args:
+        Passed on to reader, e.g. columns, cache or chunksize
+
+    return
+    ------
+
+    {folder: sweep_collection}, in the order of folders.  Files that could
+    not be read are warned about and skipped.
+    '''
+    readers = [reader(folder, **reader_args) for folder in folders]
+    limit = asyncio.Semaphore(max_open)
+
+    with ThreadPoolExecutor(max_workers=max_open) as io_pool:
+        if n_workers == 1:
+            pool = nullcontext(io_pool)
+        else:
+            pool = ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(profiler.enabled,))
+        with pool as parse_pool:
+            collections = await asyncio.gather(*[_read_folder(each_reader, limit, io_pool, parse_pool) for each_reader in readers])
+
+    return dict(zip(folders, collections))
+
+def read_folders(folders, max_open=16, n_workers=1, reader=ber_data_reader, **reader_args):
+    '''
+    read_folders_async run to completion, for scripts without an event
+    loop of their own.
+    '''
+    return asyncio.run(read_folders_async(folders, max_open, n_workers, reader, **reader_args))
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the analysis pipeline.
+
+Run this to compare the per-attenuation aggregation of ber_data_reader
+against the original boolean-filter loop for captures of 1e5 to 1e7 packets,
+the streaming Excel export of write_excel against the original
+cell-by-cell writer for 10 to 1000 modes, and to time every stage of the
+pipeline on synthetic captures of increasing size.
+"""
+import io
+import os
+import time
+import tempfile
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+import openpyxl
+from summarize_data import ber_data, ber_data_reader, check_rssi_brief
+from sensitivity_comp import target_label, sensitivities, sens_comp
+from write_excel import write_excel
+from synthetic_data import write_captures
+from link_budget import DEFAULT_BUDGET
+
+def synthetic_frame(n_rows, n_atten=20, bits_per_packet=128, seed=0):
+    '''
+    Produces a DataFrame with the columns used by the aggregation, with
+    n_rows packets spread evenly over n_atten attenuation steps.
+    '''
+    rng = np.random.default_rng(seed)
+    atten = np.repeat(np.arange(n_atten)*1., int(np.ceil(n_rows/n_atten)))[:n_rows]
+    return pd.DataFrame({'attenuation': atten,
+                         'n_bit_err': rng.binomial(bits_per_packet, 1.e-3*(1+atten), n_rows),
+                         'bits/packet': np.full(n_rows, bits_per_packet),
+                         'rssi': rng.normal(1000, 20, n_rows).astype(int),
+                         't1_rssi': rng.normal(960, 20, n_rows).astype(int)})
+
+def _aggregate_by_mask(data_obj, data_pd):
+    '''
+    The original aggregation, kept as the reference to benchmark against.
+    Returns the BER and PER dictionaries with the power level as key.
+    '''
+    ber, per, rssi, t1_rssi = dict(), dict(), dict(), dict()
+    for atten in data_pd['attenuation'].unique():
+        rx_pow = DEFAULT_BUDGET.quantize(data_obj.tx_power_dbm - data_obj.end_to_end_loss - atten*2.) #on the grid of the readers
+        filter_ = data_pd['attenuation']==atten
+        ber[rx_pow] = data_pd[filter_]['n_bit_err'].sum()/data_pd[filter_]['bits/packet'].sum()
+        per[rx_pow] = len(data_pd[filter_].query('n_bit_err>0'))/len(data_pd[filter_])
+        rssi[rx_pow] = data_pd[filter_]['rssi']
+        t1_rssi[rx_pow] = data_pd[filter_]['t1_rssi']
+    return ber, per
+
+def _best_time(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_aggregation(sizes=(10**5, 10**6, 10**7), n_atten=20, repeat=3):
+    '''
+    Times the grouped aggregation against the boolean-filter loop and checks
+    that both give the same BER and PER.
+    '''
+    reader = ber_data_reader('.')
+    print('rows'.ljust(12), 'mask (s)'.ljust(12), 'groupby (s)'.ljust(12), 'speedup'.ljust(12))
+
+    for n_rows in sizes:
+        data_pd = synthetic_frame(n_rows, n_atten)
+        ref, new = ber_data('ref'), ber_data('new')
+        ref_ber, ref_per = _aggregate_by_mask(ref, data_pd)
+        reader._aggregate(new, data_pd)
+        assert ref_ber == dict(new.ber) and ref_per == dict(new.per)
+
+        t_mask = _best_time(lambda: _aggregate_by_mask(ber_data('ref'), data_pd), repeat)
+        t_group = _best_time(lambda: reader._aggregate(ber_data('new'), data_pd), repeat)
+        print(f'{n_rows:.0e}'.ljust(12), f'{t_mask:.4f}'.ljust(12), f'{t_group:.4f}'.ljust(12), f'{t_mask/t_group:.1f}x'.ljust(12))
+
+def synthetic_comp_dict(n_modes, targets=(1.e-3, 1.e-4), seed=0):
+    '''
+    Produces a data_dict as returned by sens_comp for n_modes modes, each
+    with all nine T1 and BLF settings.
+    '''
+    rng = np.random.default_rng(seed)
+    data_dict = {'names': ['master', 'mine'], 'targets': list(targets)}
+    for mode_id in range(n_modes):
+        data_dict[mode_id] = dict()
+        for t1 in ['min', 'nom', 'max']:
+            for blf in ['neg', 'nom', 'pos']:
+                name1 = list(rng.normal(-80, 2, len(targets)))
+                name2 = list(rng.normal(-80, 2, len(targets)))
+                data_dict[mode_id][t1+'_'+blf] = {'T1': t1, 'BLF': blf, 'name1': name1, 'name2': name2,
+                                                  'delta': list(np.array(name1)-np.array(name2))}
+    return data_dict
+
+def _write_modes_by_cell(file_name, data_dict):
+    '''
+    The original Excel writer, assigning each cell by its address in an
+    in-memory workbook, kept as the reference to benchmark against.
+    '''
+    data_dict = data_dict.copy()
+    name1, name2 = data_dict.pop('names')
+    targets = data_dict.pop('targets', [1.e-3, 1.e-4])
+    wb = openpyxl.Workbook()
+    
+    for mode_id in data_dict.keys():
+        sheet = wb.create_sheet(title='mode '+str(mode_id))
+        first_row = 1
+        for t1_blf in data_dict[mode_id].keys():
+            sheet['A'+str(first_row)] = 'T1'; sheet['B'+str(first_row)] = data_dict[mode_id][t1_blf]['T1']
+            sheet['A'+str(first_row+1)] = 'BLF'; sheet['B'+str(first_row+1)] = data_dict[mode_id][t1_blf]['BLF']
+            sheet['A'+str(first_row+2)] = 'sensitivity'
+            sheet['A'+str(first_row+3)] = name1
+            sheet['A'+str(first_row+4)] = name2
+            sheet['A'+str(first_row+5)] = 'delta'
+            for col, target in enumerate(targets, start=2):
+                sheet.cell(row=first_row+2, column=col, value=target_label(target))
+                for row, key in enumerate(['name1', 'name2', 'delta'], start=first_row+3):
+                    value = data_dict[mode_id][t1_blf][key][col-2]
+                    sheet.cell(row=row, column=col, value='---' if np.isnan(value) else value)
+            first_row += 7
+    
+    wb.remove(wb['Sheet'])
+    wb.save(file_name)
+
+def _peak_memory(func):
+    '''
+    Peak of memory allocated while func ran.  Measured apart from the
+    timings, as tracing every allocation slows func down.
+    '''
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def bench_excel(sizes=(10, 100, 1000), targets=(1.e-3, 1.e-4)):
+    '''
+    Times the streaming writer of write_excel against the cell-by-cell
+    writer and checks that the per-mode sheets hold the same values.
+    '''
+    print('settings'.ljust(12), 'cell (s)'.ljust(12), 'stream (s)'.ljust(12), 'speedup'.ljust(12), 'cell (MB)'.ljust(12), 'stream (MB)'.ljust(12))
+    
+    with tempfile.TemporaryDirectory() as folder:
+        for n_modes in sizes:
+            data_dict = synthetic_comp_dict(n_modes, targets)
+            ref_name, new_name = os.path.join(folder, 'ref'), os.path.join(folder, 'new')
+            
+            write_cell = lambda: _write_modes_by_cell(ref_name+'.xlsx', data_dict)
+            write_stream = lambda: write_excel(new_name, data_dict).write_modes()
+            t_cell, t_stream = _best_time(write_cell, 1), _best_time(write_stream, 1)
+            m_cell, m_stream = _peak_memory(write_cell), _peak_memory(write_stream)
+            
+            ref_wb, new_wb = openpyxl.load_workbook(ref_name+'.xlsx'), openpyxl.load_workbook(new_name+'.xlsx')
+            sheet_name = 'mode '+str(n_modes-1)
+            assert list(ref_wb[sheet_name].values) == list(new_wb[sheet_name].values)
+            
+            print(f'{9*n_modes}'.ljust(12), f'{t_cell:.3f}'.ljust(12), f'{t_stream:.3f}'.ljust(12), f'{t_cell/t_stream:.1f}x'.ljust(12),
+                  f'{m_cell/2**20:.1f}'.ljust(12), f'{m_stream/2**20:.1f}'.ljust(12))
+
+def bench_pipeline(sizes=((1, 100), (3, 200), (6, 500)), n_atten=20, bits_per_packet=128, n_workers=1):
+    '''
+    Times each stage of the pipeline and the peak memory it allocates
+    through Python and NumPy (the C buffers of the CSV parser are not
+    traced), on synthetic captures of each size given as (number of RF
+    modes, packets per attenuation step), with all nine T1 and BLF settings
+    per mode.  A second folder with 0.5 dB worse sensitivity is compared
+    against the first.  Returns the results as a DataFrame so runs can be
+    kept and compared to catch regressions.
+    '''
+    results = []
+    
+    with tempfile.TemporaryDirectory() as folder:
+        for n_modes, n_packets in sizes:
+            baseline, branch = os.path.join(folder, f'base_{n_modes}_{n_packets}'), os.path.join(folder, f'branch_{n_modes}_{n_packets}')
+            rf_modes = tuple(range(n_modes))
+            write_captures(baseline, rf_modes, n_atten=n_atten, n_packets=n_packets, bits_per_packet=bits_per_packet)
+            write_captures(branch, rf_modes, sens_offset_db=.5, n_atten=n_atten, n_packets=n_packets, bits_per_packet=bits_per_packet)
+            
+            state = dict()
+            def parse():
+                state['data'] = ber_data_reader(baseline, n_workers=n_workers, cache=False).read()
+            def read_cached():
+                ber_data_reader(baseline, n_workers=n_workers).read()
+            def sens():
+                state['sens'] = sensitivities(*state['data'])
+                state['branch_sens'] = sensitivities(*state['branch_data'])
+            def comp():
+                state['comp'] = sens_comp(state['sens'], state['branch_sens'], 'baseline', 'branch')
+            def rssi():
+                check_rssi_brief(*state['data'])
+            def excel():
+                write_excel(os.path.join(folder, 'comparison'), state['comp']).write_modes()
+            
+            ber_data_reader(baseline, n_workers=n_workers).read() #fill the cache read by read_cached
+            state['branch_data'] = ber_data_reader(branch, n_workers=n_workers).read()
+            with contextlib.redirect_stdout(io.StringIO()): #sens_comp and check_rssi_brief print their results
+                for stage, func in [('parse CSV', parse), ('read cached', read_cached), ('sensitivities', sens),
+                                    ('sens_comp', comp), ('check_rssi_brief', rssi), ('write_excel', excel)]:
+                    elapsed = _best_time(func, 1)
+                    peak = _peak_memory(func)
+                    results += [{'modes': n_modes, 'packets': n_packets, 'rows': 9*n_modes*n_atten*n_packets,
+                                 'stage': stage, 'seconds': elapsed, 'peak_mb': peak/2**20}]
+    
+    results = pd.DataFrame(results)
+    print(results.pivot_table(index='stage', columns='rows', values=['seconds', 'peak_mb'], sort=False).round(3).to_string())
+    return results
+
+if __name__ == '__main__':
+    bench_aggregation()
+    bench_excel()
+    bench_pipeline()
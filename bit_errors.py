@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Where in the packet the bit errors fall, read from the tx_bits and xor_bits
+strings of the captures.
+
+The strings of a chunk of rows are turned into packed uint8 arrays, one row
+per packet and 8 bits per byte, with no loop over packets or characters.
+From these are counted per attenuation step: the errors at each bit
+position, which of them flipped a 1 into a 0, the bits sent at each
+position, and the lengths of the bursts of consecutive errors.  Rates are
+taken over the bits actually sent, so sweeps of different packet lengths can
+be grouped together.  Tables of these group the sweeps by setting and
+power level as in timing_analysis.
+
+    from bit_errors import bit_error_reader, segment_table
+    bit_obj = bit_error_reader('test_data').read()
+    segment_table(*bit_obj, by=['rf_mode', 'T1', 'BLF'])
+"""
+import numpy as np
+import pandas as pd
+from summarize_data import COLUMN_PROFILES, ber_data, ber_data_reader, ber_accumulator, as_sweeps, _level_groups
+from instrument import profiler
+from link_budget import DEFAULT_BUDGET
+
+# per-packet columns parsed by bit_error_reader
+BIT_COLUMNS = COLUMN_PROFILES['ber'] + ['tx_bits', 'xor_bits']
+
+# parts of the packet by bit position, as slices of the positions
+SEGMENTS = {'preamble': (0, 16), 'payload': (16, -16), 'tail': (-16, None)}
+
+def pack_bits(strings, n_bits=None):
+    '''
+    Packs strings of '0' and '1' into a uint8 array with one row per string
+    and the first bit of each string in the most significant bit of its
+    first byte, as np.packbits.  Shorter strings are padded with 0.
+
+    strings: array or Series of str
+
+    n_bits: int or None
+        Bits per row, the length of the longest string if None
+
+    return
+    ------
+
+    (packed, n_bits)
+    '''
+    chars = np.asarray(strings, dtype=bytes) #one byte per character, shorter strings padded with NUL
+    width = chars.dtype.itemsize if len(chars) else 0
+    n_bits = width if n_bits is None else n_bits
+    bits = chars.view(np.uint8).reshape(len(chars), width)[:, :n_bits] == ord('1')
+    if width < n_bits:
+        bits = np.pad(bits, ((0, 0), (0, n_bits - width)))
+    return np.packbits(bits, axis=1), n_bits
+
+def _pad(counts, width):
+    '''
+    counts widened to width columns with zeros, e.g. when a later chunk holds
+    longer packets.
+    '''
+    return np.pad(counts, ((0, 0), (0, width - counts.shape[1]))) if counts.shape[1] < width else counts
+
+class bit_error_accumulator:
+    '''
+    Running counts of the bit errors of one capture per attenuation step,
+    added a chunk of rows at a time.
+    '''
+    def __init__(self):
+        self.counts = dict() #attenuation -> array of errors, 1 to 0 flips, tx ones and bits sent (4, bit position)
+        self.bursts = dict() #attenuation -> array of the number of bursts of each length from 0 up
+
+    def add(self, chunk):
+        '''
+        Adds the packet rows in the DataFrame chunk, grouping them by
+        attenuation in a single pass.
+        '''
+        codes, atten = pd.factorize(chunk['attenuation'])
+        keep = codes >= 0
+        tx_strings = chunk['tx_bits'].to_numpy()[keep]
+        tx, n_bits = pack_bits(tx_strings)
+        xor, n_bits = pack_bits(chunk['xor_bits'].to_numpy()[keep], n_bits)
+        lengths = np.char.str_len(np.asarray(tx_strings, dtype=bytes)) if len(tx_strings) else np.zeros(0, dtype=int)
+
+        order = np.argsort(codes[keep], kind='stable') #rows of each attenuation step together for reduceat
+        codes = codes[keep][order]
+        tx, xor = tx[order], xor[order]
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        present = codes[starts] #attenuation steps with rows, in the order of starts
+
+        counts = np.zeros((len(atten), 4, n_bits), dtype=np.int64)
+        if len(codes):
+            for k, packed in enumerate((xor, xor & tx, tx)):
+                counts[present, k] = np.add.reduceat(np.unpackbits(packed, axis=1, count=n_bits), starts, axis=0, dtype=np.int64)
+        length_counts = np.bincount(codes*(n_bits + 1) + lengths[order], minlength=len(atten)*(n_bits + 1)).reshape(len(atten), n_bits + 1)
+        counts[:, 3] = np.cumsum(length_counts[:, ::-1], axis=1)[:, ::-1][:, 1:] #packets longer than each position
+
+        has_err = xor.any(axis=1) #bursts only need the packets with errors
+        bits = np.pad(np.unpackbits(xor[has_err], axis=1, count=n_bits), ((0, 0), (1, 1))).astype(np.int8)
+        edges = np.diff(bits, axis=1).ravel()
+        burst_start = np.flatnonzero(edges == 1) #runs of 1s in the rows of bits, as flat indices
+        burst_length = np.flatnonzero(edges == -1) - burst_start
+        burst_code = codes[has_err][burst_start // (n_bits + 1)]
+        bursts = np.bincount(burst_code*(n_bits + 1) + burst_length, minlength=len(atten)*(n_bits + 1)).reshape(len(atten), n_bits + 1)
+
+        for each_atten, each_counts, each_bursts in zip(atten, counts, bursts):
+            width = max(n_bits, self.counts[each_atten].shape[1] if each_atten in self.counts else 0)
+            self.counts[each_atten] = _pad(self.counts.get(each_atten, np.zeros((4, 0), dtype=np.int64)), width) + _pad(each_counts, width)
+            self.bursts[each_atten] = _pad(self.bursts.get(each_atten, np.zeros((1, 0), dtype=np.int64)), width + 1) + _pad(each_bursts[None], width + 1)
+
+    def fill(self, data_obj):
+        '''
+        Sets the bit error counts of data_obj, whose rx_pow has already been
+        set from the same rows, in the order of its attenuation steps.
+        '''
+        atten = data_obj.atten
+        width = max([counts.shape[1] for counts in self.counts.values()] + [0])
+        counts = np.array([_pad(self.counts[each], width) for each in atten], dtype=np.int64).reshape(len(atten), 4, width)
+        data_obj.bit_errors, data_obj.flips_1to0, data_obj.tx_ones, data_obj.n_sent = counts.transpose(1, 0, 2)
+        data_obj.burst_counts = np.array([_pad(self.bursts[each], width + 1)[0] for each in atten], dtype=np.int64).reshape(len(atten), width + 1)
+
+class bit_error_data(ber_data):
+    '''
+    ber_data with, for each power level in rx_pow and bit position, the
+    number of bit errors in bit_errors, of those where a 1 was sent in
+    flips_1to0, the number of 1s sent in tx_ones and the number of packets
+    long enough to reach the position in n_sent.  burst_counts holds the
+    number of bursts of consecutive errors of each length from 0 up.
+    '''
+    __slots__ = ('bit_errors', 'flips_1to0', 'tx_ones', 'n_sent', 'burst_counts')
+
+    def __init__(self, name_of_data):
+        super().__init__(name_of_data)
+        self.bit_errors = self.flips_1to0 = self.tx_ones = self.n_sent = np.zeros((0, 0), dtype=np.int64)
+        self.burst_counts = np.zeros((0, 1), dtype=np.int64)
+
+class bit_error_reader(ber_data_reader):
+    '''
+    Reads the BER curves and bit error positions of all captures in a
+    folder, always a chunk of rows at a time.  The bit errors are not kept in
+    the cache of ber_data_reader, so the CSV files are parsed on every read.
+    Capture files lack the bit strings, so only the CSV files are read.
+    '''
+    reads_captures = False
+    def __init__(self, folder_name, n_workers=1, chunksize=2**16, budget=DEFAULT_BUDGET):
+        '''
+        n_workers, budget:
+            As in ber_data_reader
+
+        chunksize: int
+            Number of packet rows parsed at a time, which bounds memory
+        '''
+        super().__init__(folder_name, n_workers=n_workers, columns=BIT_COLUMNS, cache=False, chunksize=chunksize, budget=budget)
+
+    def _read_pandas(self, file_name, raw=None):
+        data_obj = bit_error_data(file_name)
+        self._read_header(data_obj, file_name, raw)
+
+        totals = ber_accumulator()
+        bit_errors = bit_error_accumulator()
+        for chunk in self._read_chunks(file_name, raw):
+            with profiler.stage('aggregate bit errors', file_name, rows=len(chunk)):
+                totals.add(chunk)
+                bit_errors.add(chunk)
+        totals.fill(data_obj, self.budget)
+        bit_errors.fill(data_obj)
+        return data_obj
+
+def _stacked_levels(data_obj, by):
+    '''
+    The packet and bit error counts of all power levels of data_obj, one row
+    per power level padded to the longest packet, with the group of each
+    level in the groups by as in _level_groups.  Returns (codes, keys,
+    dictionary of the stacked arrays).
+    '''
+    data_obj = as_sweeps(data_obj)
+    codes, keys, sweep, level = _level_groups(data_obj, by)
+    width = max([each_data.bit_errors.shape[1] for each_data in data_obj] + [0])
+
+    stacked = {'n_packets': np.concatenate([each_data.n_packets for each_data in data_obj] + [np.zeros(0, dtype=np.int64)])}
+    for name in ('bit_errors', 'flips_1to0', 'tx_ones', 'n_sent', 'burst_counts'):
+        extra = 1 if name == 'burst_counts' else 0
+        stacked[name] = np.concatenate([_pad(getattr(each_data, name), width + extra) for each_data in data_obj] + [np.zeros((0, width + extra), dtype=np.int64)])
+    return codes, keys, stacked
+
+def _group_sums(data_obj, by):
+    '''
+    Sums the packet and bit error counts of the power levels of data_obj in
+    the groups by, as in _level_groups.  Returns the group keys and a
+    dictionary of the summed arrays, one row per group.
+    '''
+    codes, keys, stacked = _stacked_levels(data_obj, by)
+    sums = dict()
+    for name, values in stacked.items():
+        sums[name] = np.zeros((len(keys),) + values.shape[1:], dtype=np.int64)
+        np.add.at(sums[name], codes, values)
+    return keys, sums
+
+def position_table(*data_obj, by=('rf_mode', 'T1', 'BLF', 'rx_pow')):
+    '''
+    Error rate at each bit position per group of sweeps and power levels.
+
+    parameters
+    ----------
+
+    data_obj: bit_error_data
+        As read by bit_error_reader, or a sweep_collection of them
+
+    by: list of str
+        Columns to group by, as in timing_analysis.timing_table
+
+    return
+    ------
+
+    DataFrame indexed by the by columns and the bit position with columns
+    n_packets, n_sent, the packets long enough to reach the position, errors,
+    error_rate, and rate_1to0 and rate_0to1, the error rates of the bits sent
+    as 1 and as 0
+    '''
+    keys, sums = _group_sums(data_obj, by)
+    n_sent = sums['n_sent']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns = {'n_packets': np.broadcast_to(sums['n_packets'][:, None], n_sent.shape),
+                   'n_sent': n_sent,
+                   'errors': sums['bit_errors'],
+                   'error_rate': sums['bit_errors']/n_sent,
+                   'rate_1to0': sums['flips_1to0']/sums['tx_ones'],
+                   'rate_0to1': (sums['bit_errors'] - sums['flips_1to0'])/(n_sent - sums['tx_ones'])}
+
+    width = sums['bit_errors'].shape[1]
+    index = pd.MultiIndex.from_arrays([np.repeat(keys.get_level_values(name), width) for name in keys.names] +
+                                      [np.tile(np.arange(width), len(keys))], names=list(keys.names) + ['position'])
+    return pd.DataFrame({name: np.asarray(values).ravel() for name, values in columns.items()}, index=index).sort_index()
+
+def segment_table(*data_obj, by=('rf_mode', 'T1', 'BLF', 'rx_pow'), segments=None):
+    '''
+    Error rate of each part of the packet per group of sweeps and power
+    levels.
+
+    segments: dictionary
+        {name: (start, stop)} slices of the bit positions, SEGMENTS by
+        default.  The slices are taken of the packets of each power level,
+        so negative positions count from the end of its own packets.
+
+    return
+    ------
+
+    DataFrame indexed by the by columns with, for each segment, the error
+    rate of its bits (<segment>_rate) and its share of all errors
+    (<segment>_share)
+    '''
+    codes, keys, stacked = _stacked_levels(data_obj, by)
+    positions = np.arange(stacked['bit_errors'].shape[1])
+    packet_bits = (stacked['n_sent'] > 0).sum(axis=1) #longest packet of each power level
+    group_sum = lambda values: np.bincount(codes, weights=values, minlength=len(keys))
+    errors = group_sum(stacked['bit_errors'].sum(axis=1))
+    table = pd.DataFrame({'n_packets': group_sum(stacked['n_packets']).astype(np.int64), 'errors': errors.astype(np.int64)}, index=keys)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name, (start, stop) in (SEGMENTS if segments is None else segments).items():
+            bounds = np.array([slice(start, stop).indices(n_bits)[:2] for n_bits in packet_bits]).reshape(len(packet_bits), 2)
+            in_segment = (positions >= bounds[:, :1]) & (positions < bounds[:, 1:])
+            seg_errors = group_sum((stacked['bit_errors']*in_segment).sum(axis=1))
+            table[name+'_rate'] = seg_errors/group_sum((stacked['n_sent']*in_segment).sum(axis=1))
+            table[name+'_share'] = seg_errors/errors
+    return table.sort_index()
+
+def burst_table(*data_obj, by=('rf_mode', 'T1', 'BLF', 'rx_pow'), max_length=8):
+    '''
+    Lengths of the bursts of consecutive bit errors per group of sweeps and
+    power levels.
+
+    max_length: int
+        Longest burst length given its own column, longer bursts are counted
+        together
+
+    return
+    ------
+
+    DataFrame indexed by the by columns with columns n_packets, bursts,
+    mean_length, the number of bursts of each length 1 to max_length and of
+    longer bursts (>max_length)
+    '''
+    keys, sums = _group_sums(data_obj, by)
+    counts = sums['burst_counts']
+    lengths = np.arange(counts.shape[1])
+    n_bursts = counts[:, 1:].sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table = pd.DataFrame({'n_packets': sums['n_packets'], 'bursts': n_bursts,
+                              'mean_length': (counts*lengths).sum(axis=1)/n_bursts}, index=keys)
+    for length in range(1, max_length + 1):
+        table[length] = counts[:, length] if length < counts.shape[1] else 0
+    table[f'>{max_length}'] = counts[:, max_length + 1:].sum(axis=1)
+    return table.sort_index()
+
+def flip_table(*data_obj, by=('rf_mode', 'T1', 'BLF', 'rx_pow')):
+    '''
+    Direction of the bit errors per group of sweeps and power levels.
+
+    return
+    ------
+
+    DataFrame indexed by the by columns with columns errors, flips_1to0,
+    flips_0to1, and rate_1to0 and rate_0to1, the error rates of the bits
+    sent as 1 and as 0
+    '''
+    keys, sums = _group_sums(data_obj, by)
+    errors = sums['bit_errors'].sum(axis=1)
+    flips_1to0 = sums['flips_1to0'].sum(axis=1)
+    tx_ones = sums['tx_ones'].sum(axis=1)
+    n_bits = sums['n_sent'].sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table = pd.DataFrame({'errors': errors, 'flips_1to0': flips_1to0, 'flips_0to1': errors - flips_1to0,
+                              'rate_1to0': flips_1to0/tx_ones, 'rate_0to1': (errors - flips_1to0)/(n_bits - tx_ones)}, index=keys)
+    return table.sort_index()
+
+if __name__ == '__main__':
+    pd.set_option('display.width', 200)
+    bit_obj = bit_error_reader('test_data').read()
+    print(segment_table(*bit_obj))
+    print(burst_table(*bit_obj))
+    print(flip_table(*bit_obj))
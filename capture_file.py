@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Binary capture files: the per-packet numeric columns of a capture CSV file
+stored column by column, so they can be memory-mapped and read without
+parsing any text.
+
+Layout of a .bcap file:
+
+    8 bytes      magic, b'BERCAP1\\n'
+    8 bytes      length of the JSON header, little-endian uint64
+    JSON header  {'n_rows', 'metadata': the HEADER_COLUMNS of the first row,
+                  'columns': [{'name', 'dtype', 'offset'}], 'source': CSV file name}
+    columns      each one array of n_rows values, starting on a 64 byte
+                 boundary at offset bytes from the end of the header
+
+Integer columns are stored in the smallest type holding all their values.
+The bit strings and text columns are not kept; bit_errors.py needs the CSV
+files.  ber_data_reader reads a .bcap file in place of the CSV file of the
+same name as long as the CSV file is not newer.
+
+    from capture_file import convert_folder
+    convert_folder('test_data')
+"""
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+CAPTURE_EXTENSION = '.bcap'
+MAGIC = b'BERCAP1\n'
+ALIGN = 64 #bytes, so every column can be viewed in place
+
+def _aligned(n_bytes):
+    return -(-n_bytes // ALIGN) * ALIGN
+
+def _smallest_int(low, high):
+    '''
+    Smallest signed integer type holding low to high.
+    '''
+    return next(np.dtype(each) for each in (np.int8, np.int16, np.int32, np.int64)
+                if np.iinfo(each).min <= low and high <= np.iinfo(each).max)
+
+class capture_file:
+    '''
+    The columns of a .bcap file as arrays viewing the file in place: a
+    read-only memory map of file_path, or the bytes of the file if already
+    read.  Nothing is copied until the arrays are used.
+    '''
+    def __init__(self, file_path=None, raw=None):
+        buffer = np.memmap(file_path, dtype=np.uint8, mode='r') if raw is None else np.frombuffer(raw, dtype=np.uint8)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{file_path or "buffer"} is not a capture file')
+
+        header_len = int(buffer[8:16].view('<u8')[0])
+        header = json.loads(bytes(buffer[16:16+header_len]).decode())
+        data_start = _aligned(16 + header_len)
+
+        self.n_rows = header['n_rows']
+        self.metadata = header['metadata']
+        self.source = header.get('source')
+        self.columns = dict() #column name -> array
+        for column in header['columns']:
+            dtype = np.dtype(column['dtype'])
+            start = data_start + column['offset']
+            self.columns[column['name']] = buffer[start:start + self.n_rows*dtype.itemsize].view(dtype)
+
+    def header_frame(self):
+        '''
+        The metadata as a one row DataFrame, as read from the first row of
+        the CSV file for ber_data.fill_header.
+        '''
+        return pd.DataFrame([self.metadata])
+
+    def frame(self, start=0, stop=None, usecols=None):
+        '''
+        Rows start to stop of the columns usecols as a DataFrame.  usecols is
+        a list of names, a function of the name as in pd.read_csv, or None for
+        all columns; names not in the file are left out.
+        '''
+        if usecols is None:
+            names = list(self.columns)
+        elif callable(usecols):
+            names = [name for name in self.columns if usecols(name)]
+        else:
+            names = [name for name in usecols if name in self.columns]
+        return pd.DataFrame({name: self.columns[name][start:stop] for name in names}, copy=False)
+
+def write_capture_file(csv_path, out_path=None, chunksize=2**18):
+    '''
+    Converts one capture CSV file to a .bcap file, reading it chunksize
+    rows at a time so memory stays bounded.  Returns the path written,
+    by default the CSV path with the extension CAPTURE_EXTENSION.
+    '''
+    from summarize_data import CSV_DTYPES, HEADER_COLUMNS
+    out_path = os.path.splitext(csv_path)[0] + CAPTURE_EXTENSION if out_path is None else out_path
+    numeric = [name for name, kind in CSV_DTYPES.items() if kind in (int, float, bool) and name not in HEADER_COLUMNS]
+
+    header_pd = pd.read_csv(csv_path, header=0, dtype=CSV_DTYPES, usecols=HEADER_COLUMNS, nrows=1)
+    metadata = {name: header_pd[name].iloc[0].item() if hasattr(header_pd[name].iloc[0], 'item') else header_pd[name].iloc[0]
+                for name in HEADER_COLUMNS}
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out_path))) as temp_folder:
+        parts = dict() #column name -> [temp file, dtype, lowest, highest]
+        n_rows = 0
+        for chunk in pd.read_csv(csv_path, header=0, dtype=CSV_DTYPES, usecols=lambda name: name in numeric, chunksize=chunksize):
+            for name in chunk.columns:
+                values = chunk[name].to_numpy()
+                if name not in parts:
+                    parts[name] = [open(os.path.join(temp_folder, str(len(parts))), 'wb'), values.dtype, None, None]
+                part = parts[name]
+                part[0].write(values.astype(part[1]).tobytes())
+                if values.dtype.kind == 'i' and len(values):
+                    part[2] = values.min() if part[2] is None else min(part[2], values.min())
+                    part[3] = values.max() if part[3] is None else max(part[3], values.max())
+            n_rows += len(chunk)
+
+        columns = []
+        offset = 0
+        for name, (part_file, dtype, lowest, highest) in parts.items():
+            part_file.close()
+            stored = _smallest_int(lowest, highest) if dtype.kind == 'i' and lowest is not None else dtype
+            columns += [{'name': name, 'dtype': stored.newbyteorder('<').str, 'offset': offset}]
+            offset = _aligned(offset + n_rows*stored.itemsize)
+
+        header = json.dumps({'n_rows': n_rows, 'metadata': metadata, 'columns': columns, 'source': os.path.basename(csv_path)}).encode()
+        with open(out_path+'.tmp', 'wb') as out_file:
+            out_file.write(MAGIC + np.array(len(header), dtype='<u8').tobytes() + header)
+            data_start = _aligned(16 + len(header))
+            for column, (part_file, dtype, _, _) in zip(columns, parts.values()):
+                out_file.write(b'\0'*(data_start + column['offset'] - out_file.tell()))
+                if column['dtype'] == dtype.newbyteorder('<').str or n_rows == 0:
+                    with open(part_file.name, 'rb') as part:
+                        shutil.copyfileobj(part, out_file)
+                else:
+                    parsed = np.memmap(part_file.name, dtype=dtype, mode='r')
+                    for start in range(0, n_rows, chunksize):
+                        out_file.write(parsed[start:start+chunksize].astype(column['dtype']).tobytes())
+                    del parsed #closes the map before the temporary folder is removed
+        os.replace(out_path+'.tmp', out_path) #only a complete file ever replaces a capture
+    return out_path
+
+def convert_folder(folder_name, chunksize=2**18, force=False):
+    '''
+    Converts every CSV file of folder_name without an up to date .bcap file
+    next to it, or every CSV file if force.  Returns the paths written.
+    '''
+    written = []
+    for file_name in sorted(next(os.walk(folder_name))[2]):
+        if not file_name.endswith('.csv'):
+            continue
+        csv_path = os.path.join(folder_name, file_name)
+        out_path = os.path.splitext(csv_path)[0] + CAPTURE_EXTENSION
+        if force or not os.path.isfile(out_path) or os.path.getmtime(out_path) < os.path.getmtime(csv_path):
+            written += [write_capture_file(csv_path, out_path, chunksize)]
+    return written
+
+if __name__ == '__main__':
+    print(convert_folder('test_data'))
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line entry point of the BER analysis, in place of editing the
+__main__ blocks of the scripts.
+
+    python cli.py ingest test_data
+    python cli.py convert test_data
+    python cli.py sensitivity test_data --targets 1e-3 1e-4 --rf-mode 11 120
+    python cli.py compare test_data_7_good test_data --names master mine --format json
+    python cli.py rssi-check test_data --t1 min nom --format csv -o rssi.csv
+    python cli.py report test_data --baseline test_data_7_good --out report
+    python cli.py sensitivity test_data --profile profile.json
+
+Tables are printed as text by default, or written as JSON or CSV for
+dashboards.  Matplotlib and openpyxl are only imported by the stages that
+need them, so printing numbers costs little more than importing NumPy and
+pandas.  compare exits with status 1 when a regression is flagged, so it
+can gate a CI job.  --profile writes the time spent in each stage, per
+file, to a JSON file, with the slowest functions found by cProfile.
+"""
+import argparse
+import sys
+from summarize_data import COLUMN_PROFILES
+
+def _read(folder, args):
+    '''
+    Reads the sweeps of folder and keeps those matching the filters.
+    '''
+    from summarize_data import ber_data_reader
+    sweeps = ber_data_reader(folder, n_workers=args.workers, columns=args.columns, cache=not args.no_cache).read_sweeps()
+    return sweeps.select(t1_time=args.t1, blf_err=args.blf, **({} if args.rf_mode is None else {'rf_mode': args.rf_mode}))
+
+def _emit(table, args, print_text):
+    '''
+    Writes table as JSON or CSV to args.output, or prints it as text with
+    print_text.
+    '''
+    if args.format == 'text':
+        print_text()
+        return
+
+    flat = table.reset_index() if table.index.name or table.index.nlevels > 1 else table
+    if flat.columns.nlevels > 1: #e.g. ('sens', 'master') -> 'sens_master'
+        flat.columns = ['_'.join(str(level) for level in column if level != '') for column in flat.columns]
+    for column in flat.columns:
+        if flat[column].dtype == 'category':
+            flat[column] = flat[column].astype(object)
+
+    text = flat.to_json(orient='records', indent=1) if args.format == 'json' else flat.to_csv(index=False)
+    if args.output:
+        with open(args.output, 'w', newline='') as out_file:
+            out_file.write(text)
+    else:
+        sys.stdout.write(text+'\n')
+
+def _curve_table(data_obj):
+    '''
+    One row per sweep and power level with its BER and PER.
+    '''
+    import numpy as np
+    import pandas as pd
+    n_points = [len(each_data.rx_pow) for each_data in data_obj]
+    return pd.DataFrame({'name_of_file': np.repeat([each_data.name_of_file for each_data in data_obj], n_points),
+                         'rf_mode': np.repeat([each_data.rf_mode for each_data in data_obj], n_points),
+                         'T1': np.repeat([each_data.t1_time for each_data in data_obj], n_points),
+                         'BLF': np.repeat([each_data.blf_err for each_data in data_obj], n_points),
+                         'rx_pow': np.concatenate([each_data.rx_pow for each_data in data_obj] + [[]]),
+                         'ber': np.concatenate([each_data.ber_curve for each_data in data_obj] + [[]]),
+                         'per': np.concatenate([each_data.per_curve for each_data in data_obj] + [[]])})
+
+def ingest(args):
+    data_obj = _read(args.folder, args)
+
+    def print_text():
+        print(f'{len(data_obj)} sweeps read from {args.folder}')
+        for each_data in data_obj:
+            print(each_data.name_of_file.ljust(32), f'mode {each_data.rf_mode}'.ljust(12), f'T1: {each_data.t1_time}'.ljust(10),
+                  f'BLF: {each_data.blf_err}'.ljust(10), f'{len(each_data.rx_pow)} power levels')
+    _emit(_curve_table(data_obj), args, print_text)
+
+def convert(args):
+    from capture_file import convert_folder
+    for folder in args.folders:
+        written = convert_folder(folder, force=args.force)
+        print(f'{len(written)} files converted in {folder}')
+
+def sensitivity(args):
+    from sensitivity_comp import sensitivities, sens_disp, sens_table
+    sens_dict = sensitivities(*_read(args.folder, args), targets=args.targets, metric=args.metric)
+    table = sens_table({args.folder: sens_dict}, t1=args.t1, blf=args.blf)['sens'].rename(columns={args.folder: 'sens'})
+    _emit(table, args, lambda: sens_disp(sens_dict, t1=args.t1, blf=args.blf))
+
+def compare(args):
+    from sensitivity_comp import sensitivities, sens_table, sens_table_disp
+    names = args.names or args.folders
+    if len(names) != len(args.folders):
+        raise SystemExit('give one name per folder')
+
+    sens_sets = {name: sensitivities(*_read(folder, args), targets=args.targets, metric=args.metric)
+                 for name, folder in zip(names, args.folders)}
+    table = sens_table(sens_sets, tolerance_db=args.tolerance, t1=args.t1, blf=args.blf)
+    _emit(table, args, lambda: sens_table_disp(table))
+
+    if args.excel:
+        from sensitivity_comp import sens_comp_dict
+        from write_excel import write_excel
+        if len(names) != 2:
+            raise SystemExit('--excel compares exactly two folders')
+        write_excel(args.excel, sens_comp_dict(sens_sets[names[0]], sens_sets[names[1]], *names, tolerance_db=args.tolerance)).write_modes()
+    return 1 if table['regression'].to_numpy().any() else 0
+
+def rssi_check(args):
+    from summarize_data import rssi_check_table, check_rssi, check_rssi_brief
+    if args.columns == 'ber':
+        raise SystemExit("rssi-check needs the RSSI columns, not --columns ber")
+    table = rssi_check_table(*_read(args.folder, args), tolerance=args.tolerance)
+    if args.brief:
+        _emit(table, args, lambda: check_rssi_brief(table=table))
+    else:
+        _emit(table, args, lambda: check_rssi(table=table))
+
+def report(args):
+    from report import render_report
+    from sensitivity_comp import sensitivities
+    data_obj = _read(args.folder, args)
+    sens_sets = None
+    if args.baseline:
+        sens_sets = {'baseline': sensitivities(*_read(args.baseline, args), targets=args.targets, metric=args.metric),
+                     'candidate': sensitivities(*data_obj, targets=args.targets, metric=args.metric)}
+    print(render_report(data_obj, args.out, sens_sets=sens_sets, tolerance_db=args.tolerance, fmt=args.image_format))
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--rf-mode', type=int, nargs='+', help='RF modes to keep, all by default')
+    common.add_argument('--t1', nargs='+', default=['min', 'nom', 'max'], help='T1 settings to keep')
+    common.add_argument('--blf', nargs='+', default=['neg', 'nom', 'pos'], help='BLF error settings to keep')
+    common.add_argument('--workers', type=int, default=1, help='worker processes parsing CSV files, 0 for one per CPU')
+    common.add_argument('--columns', choices=list(COLUMN_PROFILES), default='rssi',
+                        help="column profile to parse, 'ber' is faster but has no RSSI; changing it parses cached files again")
+    common.add_argument('--no-cache', action='store_true', help='parse the CSV files even if cached')
+    common.add_argument('--format', choices=['text', 'json', 'csv'], default='text')
+    common.add_argument('-o', '--output', help='file to write JSON or CSV to, stdout by default')
+    common.add_argument('--profile', help='JSON file to write stage timings and a cProfile summary to')
+
+    targets = argparse.ArgumentParser(add_help=False)
+    targets.add_argument('--targets', type=float, nargs='+', default=[1.e-3, 1.e-4], help='BER (or PER) of each sensitivity point')
+    targets.add_argument('--metric', choices=['ber', 'per'], default='ber')
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('ingest', parents=[common], help='read a folder, filling the cache, and list the curves')
+    command.add_argument('folder')
+    command.set_defaults(func=ingest)
+
+    command = commands.add_parser('convert', help='convert CSV files to binary capture files, which are read instead')
+    command.add_argument('folders', nargs='+')
+    command.add_argument('--force', action='store_true', help='convert files whose capture file is up to date too')
+    command.set_defaults(func=convert, workers=1, profile=None)
+
+    command = commands.add_parser('sensitivity', parents=[common, targets], help='sensitivity points of a folder')
+    command.add_argument('folder')
+    command.set_defaults(func=sensitivity)
+
+    command = commands.add_parser('compare', parents=[common, targets], help='sensitivities of folders against the first one')
+    command.add_argument('folders', nargs='+')
+    command.add_argument('--names', nargs='+', help='name of each folder in the table')
+    command.add_argument('--tolerance', type=float, default=.5, help='dB worse than the baseline flagged as a regression')
+    command.add_argument('--excel', help='also write an Excel file of this name (without .xlsx), two folders only')
+    command.set_defaults(func=compare)
+
+    command = commands.add_parser('rssi-check', parents=[common], help='RSSI anomaly checks of a folder')
+    command.add_argument('folder')
+    command.add_argument('--tolerance', type=float, default=50.)
+    command.add_argument('--brief', action='store_true', help='pass/fail per sweep only (text format)')
+    command.set_defaults(func=rssi_check)
+
+    command = commands.add_parser('report', parents=[common, targets], help='render figures and an index page')
+    command.add_argument('folder')
+    command.add_argument('--baseline', help='folder whose sensitivities the report compares against')
+    command.add_argument('--out', default='report', help='folder the report is written to')
+    command.add_argument('--tolerance', type=float, default=.5)
+    command.add_argument('--image-format', choices=['png', 'svg'], default='png')
+    command.set_defaults(func=report)
+
+    args = parser.parse_args(argv)
+    args.workers = args.workers or None
+    if not args.profile:
+        return args.func(args) or 0
+
+    from instrument import profiler
+    profiler.enable(profile=True)
+    try:
+        return args.func(args) or 0
+    finally:
+        profiler.disable()
+        profiler.write_json(args.profile)
+
+if __name__ == '__main__':
+    sys.exit(main())
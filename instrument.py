@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Stage timers for finding where an analysis run spends its time.
+
+The stages of the pipeline (CSV parsing, aggregation, cache reads, RSSI
+checks, sensitivity interpolation, figures, Excel) are wrapped in
+profiler.stage or the timed decorator.  While profiler is disabled, which
+it is by default, these cost one attribute lookup.  Once enabled they
+count the calls, seconds, rows and bytes of each stage, per file where
+one is given, and optionally run cProfile alongside:
+
+    from instrument import profiler
+    profiler.enable(profile=True)
+    ...analysis...
+    profiler.write_json('profile.json')
+"""
+import cProfile
+import functools
+import io
+import json
+import pstats
+import time
+
+class _null_stage:
+    '''
+    Stands in for a stage while profiling is disabled.
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, rows=0, n_bytes=0):
+        pass
+
+    def discard(self):
+        pass
+
+_NULL_STAGE = _null_stage()
+
+class _stage:
+    '''
+    Times one pass through a stage and adds it to the profiler's records
+    on exit.
+    '''
+    __slots__ = ('profiler', 'name', 'file_name', 'rows', 'n_bytes', 'start', 'discarded')
+
+    def __init__(self, profiler, name, file_name, rows, n_bytes):
+        self.profiler = profiler
+        self.name = name
+        self.file_name = file_name
+        self.rows = rows
+        self.n_bytes = n_bytes
+        self.discarded = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.discarded:
+            return False
+        self.profiler._add(self.name, self.file_name, [1, time.perf_counter() - self.start, self.rows, self.n_bytes])
+        return False
+
+    def count(self, rows=0, n_bytes=0):
+        '''
+        Adds rows and bytes processed by this pass, when only known inside it.
+        '''
+        self.rows += rows
+        self.n_bytes += n_bytes
+
+    def discard(self):
+        '''
+        Leaves this pass out of the records, e.g. when it found nothing to do.
+        '''
+        self.discarded = True
+
+class stage_profiler:
+    '''
+    Per-stage and per-file counters of calls, seconds, rows and bytes.
+    '''
+    def __init__(self):
+        self.enabled = False
+        self.records = dict() #(stage, file name or None) -> [calls, seconds, rows, bytes]
+        self.cprofile = None
+        self.start = None
+
+    def enable(self, profile=False):
+        '''
+        Starts counting from scratch, also running cProfile if profile.
+        '''
+        self.disable() #stops a cProfile still running, e.g. inherited by a forked worker
+        self.cprofile = None
+        self.records = dict()
+        self.enabled = True
+        self.start = time.perf_counter()
+        if profile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def disable(self):
+        self.enabled = False
+        if self.cprofile is not None:
+            self.cprofile.disable()
+
+    def stage(self, name, file_name=None, rows=0, n_bytes=0):
+        '''
+        Context manager timing one pass through the stage name.  Rows and
+        bytes known later can be added with count on the returned object.
+        '''
+        if not self.enabled:
+            return _NULL_STAGE
+        return _stage(self, name, file_name, rows, n_bytes)
+
+    def _add(self, name, file_name, counts):
+        record = self.records.setdefault((name, file_name), [0, 0., 0, 0])
+        for n, count in enumerate(counts):
+            record[n] += count
+
+    def drain(self):
+        '''
+        Returns the records so far and clears them, for worker processes to
+        hand their records back to be merged.  None while disabled.
+        '''
+        if not self.enabled:
+            return None
+        records, self.records = self.records, dict()
+        return records
+
+    def merge(self, records):
+        '''
+        Adds the records drained from a worker process.
+        '''
+        for (name, file_name), counts in (records or {}).items():
+            self._add(name, file_name, counts)
+
+    def summary(self, top=30):
+        '''
+        The records as a dictionary ready for JSON: the seconds since enable,
+        totals of each stage with its files, and the top functions by
+        cumulative time if cProfile ran.
+        '''
+        stages = dict()
+        for (name, file_name), (calls, seconds, rows, n_bytes) in self.records.items():
+            entry = stages.setdefault(name, {'calls': 0, 'seconds': 0., 'rows': 0, 'bytes': 0, 'files': dict()})
+            entry['calls'] += calls
+            entry['seconds'] += seconds
+            entry['rows'] += rows
+            entry['bytes'] += n_bytes
+            if file_name is not None:
+                entry['files'][file_name] = {'calls': calls, 'seconds': seconds, 'rows': rows, 'bytes': n_bytes}
+
+        summary = {'wall_seconds': time.perf_counter() - self.start if self.start is not None else 0.,
+                   'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['seconds']))}
+
+        if self.cprofile is not None:
+            stats = pstats.Stats(self.cprofile, stream=io.StringIO())
+            functions = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:top] #by cumulative time
+            summary['functions'] = [{'function': f'{file}:{line}({func})', 'calls': n_calls, 'own_seconds': own, 'cumulative_seconds': cumulative}
+                                    for (file, line, func), (_, n_calls, own, cumulative, _) in functions]
+        return summary
+
+    def write_json(self, file_path, top=30):
+        with open(file_path, 'w') as json_file:
+            json.dump(self.summary(top), json_file, indent=1)
+
+profiler = stage_profiler()
+
+def timed(name):
+    '''
+    Decorator timing every call of a function as the stage name.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with profiler.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def init_worker(enabled):
+    '''
+    Initializer of worker processes, so they record stages while the
+    parent does.
+    '''
+    if enabled:
+        profiler.enable()
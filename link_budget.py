@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Model of the power at the antenna input of each attenuation step of a
+sweep, from the transmit power, the attenuator setting and the losses of
+the forward (reader to tag) and reverse (tag to reader) paths.
+
+By default the model is the one the captures were always read with,
+
+    rx_pow = tx_power_dbm - end_to_end_loss - 2*atten
+
+but the fixed losses can be given per frequency, e.g. measured cable and
+antenna losses over the FCC hop set, and the attenuator can weigh
+differently in the two directions.  Every power is rounded onto a grid of
+1/steps_per_db dB, so the same power from different files and hop
+frequencies is the same float and curves join exactly.
+
+    from link_budget import link_budget, loss_table
+    budget = link_budget(forward_loss=loss_table.read_csv('cable_loss.csv'), reverse_loss=1.2)
+    sweeps = ber_data_reader('test_data', budget=budget).read_sweeps()
+"""
+import numpy as np
+import pandas as pd
+
+POWER_STEPS_PER_DB = 100 #power levels are rounded to 0.01 dB
+FCC_CHANNELS_MHZ = 902.75 + .5*np.arange(50) #centre frequencies of the FCC hop set
+
+class loss_table:
+    '''
+    Loss in dB against frequency in MHz, interpolated linearly between the
+    frequencies given and held at the end values beyond them.
+    '''
+    def __init__(self, freq_mhz, loss_db):
+        order = np.argsort(freq_mhz)
+        self.freq_mhz = np.asarray(freq_mhz, dtype=float)[order]
+        self.loss_db = np.asarray(loss_db, dtype=float)[order]
+
+    @classmethod
+    def read_csv(cls, file_path):
+        '''
+        Reads a table with columns freq_mhz and loss_db.
+        '''
+        table = pd.read_csv(file_path)
+        return cls(table['freq_mhz'], table['loss_db'])
+
+    def __call__(self, freq_mhz):
+        return np.interp(freq_mhz, self.freq_mhz, self.loss_db)
+
+    def __repr__(self):
+        return f'loss_table({len(self.freq_mhz)} frequencies, {self.loss_db.min():.2f} to {self.loss_db.max():.2f} dB)'
+
+def _loss(loss, freq_mhz):
+    return loss(freq_mhz) if callable(loss) else loss
+
+class link_budget:
+    '''
+    Power at the antenna input of each attenuation step, going through the
+    forward path to the tag and back through the reverse path.
+    '''
+    def __init__(self, forward_loss=None, reverse_loss=0., forward_atten=1., reverse_atten=1., steps_per_db=POWER_STEPS_PER_DB):
+        '''
+        forward_loss, reverse_loss: float, loss_table or function of freq_mhz
+            Fixed loss in dB of each path.  A forward_loss of None takes the
+            end_to_end_loss of each capture, which covers both paths.
+
+        forward_atten, reverse_atten: float
+            dB of loss of each path per dB of attenuator setting, 1 for an
+            attenuator both ways through.  Both must be positive, so power
+            always falls as attenuation rises.
+
+        steps_per_db: int
+            Resolution of the grid the powers are rounded to.
+        '''
+        if forward_atten <= 0 or reverse_atten <= 0:
+            raise ValueError('forward_atten and reverse_atten must be positive')
+        self.forward_loss = forward_loss
+        self.reverse_loss = reverse_loss
+        self.forward_atten = forward_atten
+        self.reverse_atten = reverse_atten
+        self.steps_per_db = steps_per_db
+
+    def quantize(self, power_dbm):
+        '''
+        power_dbm rounded onto the grid.  Dividing the integer grid index
+        gives the float nearest to the decimal value, whatever the rounding
+        errors of the sums that produced power_dbm.
+        '''
+        return self.grid_index(power_dbm)/self.steps_per_db
+
+    def grid_index(self, power_dbm):
+        '''
+        Integer index of power_dbm on the grid, for joins on integer keys.
+        '''
+        return np.round(np.asarray(power_dbm, dtype=float)*self.steps_per_db).astype(np.int64)
+
+    def forward_power(self, tx_power_dbm, atten, freq_mhz, end_to_end_loss):
+        '''
+        Power reaching the tag, not rounded.  The arguments are scalars or
+        arrays of the same length, one value per attenuation step.
+        '''
+        forward_loss = end_to_end_loss if self.forward_loss is None else _loss(self.forward_loss, freq_mhz)
+        return tx_power_dbm - forward_loss - self.forward_atten*np.asarray(atten, dtype=float)
+
+    def rx_power(self, tx_power_dbm, atten, freq_mhz, end_to_end_loss):
+        '''
+        Power back at the antenna input, rounded onto the grid.
+        '''
+        reverse = _loss(self.reverse_loss, freq_mhz) + self.reverse_atten*np.asarray(atten, dtype=float)
+        return self.quantize(self.forward_power(tx_power_dbm, atten, freq_mhz, end_to_end_loss) - reverse)
+
+    def sweep_power(self, data_obj, atten):
+        '''
+        rx_power of the attenuation steps atten of one ber_data.
+        '''
+        return self.rx_power(data_obj.tx_power_dbm, atten, data_obj.freq_mhz, data_obj.end_to_end_loss)
+
+    def apply(self, *data_obj):
+        '''
+        Sets the rx_pow of data_obj, or of a sweep_collection, from the
+        attenuation steps they were read with, all sweeps in one vectorized
+        pass.  The order of the power levels is unchanged as power falls with
+        attenuation in every budget.  Sweeps not read with their attenuation
+        steps are left as they are.
+        '''
+        from summarize_data import as_sweeps
+        data_obj = [each_data for each_data in as_sweeps(data_obj) if len(each_data.atten) == len(each_data.rx_pow)]
+        n_pow = [len(each_data.atten) for each_data in data_obj]
+        if not sum(n_pow):
+            return
+        settings = np.array([(each_data.tx_power_dbm, each_data.freq_mhz, each_data.end_to_end_loss) for each_data in data_obj], dtype=float)
+        tx_power_dbm, freq_mhz, end_to_end_loss = np.repeat(settings, n_pow, axis=0).T
+        rx_pow = self.rx_power(tx_power_dbm, np.concatenate([each_data.atten for each_data in data_obj]), freq_mhz, end_to_end_loss)
+        for each_data, each_pow in zip(data_obj, np.split(rx_pow, np.cumsum(n_pow)[:-1])):
+            each_data.rx_pow = each_pow
+
+DEFAULT_BUDGET = link_budget() #the model the captures have always been read with
@@ -5,11 +5,12 @@ Created on Wed Sep 29 13:12:03 2021
 @author: thuang
 
 Plots the sensitivity delta = master_branch - my_branch
-for 1e3 and 1e4.
+for each BER target, 1e3 and 1e4 by default.
 """
 
 from matplotlib import pyplot as plt
 import numpy as np
+from sensitivity_comp import target_label
 
 class delta_bars:
     
@@ -20,7 +21,10 @@ class delta_bars:
 
         data_dict : dictionary
             A dictionary containing the data to write to the Excel file.
-            Dictionary shall contain: {'names':[name1, name2], mode_id:{t1_blf:{'T1': t1, 'BLF': blf, 'name1':[1e3, 1e4], 'name2':[1e3, 1e4], 'delta':[1e3, 1e4]}}}
+            Dictionary shall contain: {'names':[name1, name2], 'targets':[1e-3, 1e-4, ...], mode_id:{t1_blf:{'T1': t1, 'BLF': blf, 'name1':[1e3, 1e4, ...], 'name2':[1e3, 1e4, ...], 'delta':[1e3, 1e4, ...]}}}
+            as returned by sens_comp, with one sensitivity per target.  'targets' defaults to [1e-3, 1e-4].
+            A title is red where the first target has a delta below -tolerance, or where
+            flagged in the 'regression' list of an entry if it has one.
             
         Returns
         -------
@@ -32,10 +36,14 @@ class delta_bars:
         
     def plot_delta(self):
         """
-        Plots the delta for each scenario of each mode as a bar graph.
+        Plots the delta for each scenario of each mode as a bar graph and
+        returns the figure.
         """
 
         self.data_dict.pop('names', None)
+        targets = self.data_dict.pop('targets', [1.e-3, 1.e-4])
+        width = .5/len(targets) if len(targets) > 2 else .25 #bars of all targets fit within one tick
+        colors = ['tab:blue', 'tab:red', 'tab:green', 'tab:orange', 'tab:purple', 'tab:brown', 'tab:pink', 'tab:gray']
         
         num_modes = len(self.data_dict) #number of modes
         num_cols = int(np.ceil(np.sqrt(num_modes))) #make the plot grid as square as possible to save space
@@ -52,21 +60,25 @@ class delta_bars:
         
         for n, mode_id in enumerate(self.data_dict.keys()):
             labels = []
-            delta_e3 = []
-            delta_e4 = []
+            delta = [] #one row of deltas per T1, BLF setting
+            regression = []
             for t1_blf in self.data_dict[mode_id].keys():
                 labels += [self.data_dict[mode_id][t1_blf]['T1'] + ',' + self.data_dict[mode_id][t1_blf]['BLF']]
-                delta_e3 += [self.data_dict[mode_id][t1_blf]['delta'][0]]
-                delta_e4 += [self.data_dict[mode_id][t1_blf]['delta'][1]]
-            ax[n].bar(np.arange(len(labels)), delta_e3, tick_label=labels, color='tab:blue', width=.25)
-            ax[n].bar(np.arange(len(labels))+.25, delta_e4, tick_label=labels, color='tab:red', width=.25)
-            ax[n].legend(['1e-3', '1e-4'], fontsize='xx-large')
+                delta += [self.data_dict[mode_id][t1_blf]['delta']]
+                regression += [self.data_dict[mode_id][t1_blf].get('regression', np.array(self.data_dict[mode_id][t1_blf]['delta']) < -self.tolerance)]
+            delta = np.array(delta, dtype=float).reshape(len(labels), len(targets))
+            regression = np.array(regression, dtype=bool).reshape(len(labels), len(targets))
+            for k in range(len(targets)):
+                ax[n].bar(np.arange(len(labels))+k*width, delta[:, k], tick_label=labels, color=colors[k % len(colors)], width=width)
+            ax[n].legend([target_label(target) for target in targets], fontsize='xx-large')
             ax[n].grid(True, which='both', axis='both')
             ax[n].set_xlabel('T1, BLF', fontsize='xx-large')
             ax[n].set_ylabel(chr(916)+'sensitivity (dBm)', fontsize='xx-large')
-            if (np.array(delta_e3) < -self.tolerance).any():
+            if regression[:, 0].any():
                 ax[n].set_title(f'Mode {mode_id}', fontsize='xx-large', color='red')
             else:
                 ax[n].set_title(f'Mode {mode_id}', fontsize='xx-large', color='green')
             ax[n].tick_params(axis='both', labelsize='xx-large')
             ax[n].minorticks_on()
+        
+        return fig1
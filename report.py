@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Renders a regression report without a display: the BER curves of each RF
+mode, the RSSI histograms of each sweep and the sensitivity delta bars of
+each data set against a baseline are saved as image files and linked from
+an index.html page.
+
+The figures are drawn in worker processes using the non-interactive Agg
+backend, so this runs on analysis nodes without a display and leaves the
+backend of the calling script alone.
+"""
+import os
+import html
+from concurrent.futures import ProcessPoolExecutor
+from sensitivity_comp import target_label, sens_table
+from instrument import profiler, init_worker
+from summarize_data import as_sweeps
+
+def _init_worker(profiling):
+    import matplotlib
+    matplotlib.use('agg')
+    init_worker(profiling)
+
+def _render(job):
+    '''
+    Draws one figure and saves it to file_path.  Runs in a worker process,
+    so returns the stage timings recorded meanwhile along with file_path.
+
+    job: tuple
+        (kind, args, file_path) with kind 'ber' (args: data objects of one RF
+        mode), 'rssi' (args: one data object) or 'delta' (args: data_dict as
+        returned by sens_comp and the tolerance in dB)
+    '''
+    from matplotlib import pyplot as plt
+    from summarize_data import _visualize_ber_curves_plotter, _visualize_rssi_plotter
+    from plot_ber_delta import delta_bars
+
+    kind, args, file_path = job
+    with profiler.stage('render figure', os.path.basename(file_path)):
+        if kind == 'ber':
+            fig = _visualize_ber_curves_plotter(*args)
+        elif kind == 'rssi':
+            fig = _visualize_rssi_plotter(args)
+        else:
+            fig = delta_bars(*args).plot_delta()
+
+        n_rows, n_cols = fig.axes[0].get_subplotspec().get_geometry()[:2]
+        fig.set_size_inches(8*n_cols, 6*n_rows) #the xx-large fonts need room a window would otherwise give
+        fig.tight_layout()
+        fig.savefig(file_path)
+        plt.close(fig)
+    return file_path, profiler.drain()
+
+def _delta_dict(table, name):
+    '''
+    Converts the deltas of data set name in a table from sens_table into the
+    data_dict layout of sens_comp taken by delta_bars.
+    '''
+    data_dict = {'names': [table.attrs['baseline'], name], 'targets': list(table.index.levels[3])}
+
+    for (rf_mode, each_t1, each_blf), setting_table in table.groupby(level=['rf_mode', 'T1', 'BLF'], sort=False, observed=True):
+        if setting_table['sens', name].isna().all(): #setting not in this data set
+            continue
+        data_dict.setdefault(rf_mode, {})
+        data_dict[rf_mode][each_t1+'_'+each_blf] = {'T1': each_t1, 'BLF': each_blf,
+                                                    'delta': list(setting_table['delta', name])}
+    return data_dict
+
+def render_report(data_obj, out_folder='report', sens_sets=None, baseline=None, tolerance_db=.5, fmt='png', n_workers=None):
+    '''
+    Saves all the figures of a report to out_folder and writes index.html
+    linking them.  Returns the path of index.html.
+
+    parameters
+    ----------
+
+    data_obj: list of ber_data or sweep_collection
+        Sweeps whose BER curves and RSSI histograms are drawn
+
+    sens_sets: dictionary
+        {name: sensitivity dictionary as returned by sensitivities}.  When
+        given, the report holds the table from sens_table and, for each data
+        set other than the baseline, a delta bar chart.
+
+    baseline, tolerance_db:
+        As in sens_table
+
+    fmt: str
+        Image format, 'png' or 'svg'
+
+    n_workers: int or None
+        Number of worker processes drawing figures, one per CPU if None
+    '''
+    os.makedirs(out_folder, exist_ok=True)
+
+    by_mode = {rf_mode: list(mode_data) for rf_mode, mode_data in as_sweeps(data_obj).groupby('rf_mode').items()}
+
+    jobs = []
+    for rf_mode, mode_data in by_mode.items():
+        jobs += [('ber', mode_data, f'ber_mode{rf_mode}.{fmt}')]
+        jobs += [('rssi', each_data, f'rssi_{os.path.splitext(each_data.name_of_file)[0]}.{fmt}')
+                 for each_data in mode_data if len(each_data.rssi_hists) and len(each_data.t1_rssi_hists)]
+
+    table = None
+    if sens_sets:
+        table = sens_table(sens_sets, baseline=baseline, tolerance_db=tolerance_db)
+        jobs += [('delta', (_delta_dict(table, name), tolerance_db), f'delta_{name}.{fmt}')
+                 for name in table['sens'].columns if name != table.attrs['baseline']]
+
+    jobs = [(kind, args, os.path.join(out_folder, file_name)) for kind, args, file_name in jobs]
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(profiler.enabled,)) as pool:
+        for file_path, records in pool.map(_render, jobs, chunksize=max(1, len(jobs)//(4*(n_workers or os.cpu_count() or 1)))):
+            profiler.merge(records)
+
+    index_path = os.path.join(out_folder, 'index.html')
+    with open(index_path, 'w') as index_file:
+        index_file.write(_index_html(by_mode, table, fmt))
+    return index_path
+
+def _index_html(by_mode, table, fmt):
+    '''
+    The index page, with one section per RF mode and the sensitivity
+    comparison at the top.
+    '''
+    page = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>BER report</title></head><body>', '<h1>BER report</h1>']
+
+    if table is not None:
+        names = list(table['sens'].columns)
+        page += ['<h2>Sensitivity</h2>', f'<p>Baseline: {html.escape(str(table.attrs["baseline"]))}, '
+                 f'tolerance: {table.attrs["tolerance_db"]} dB</p>']
+        page += [f'<img src="delta_{html.escape(name)}.{fmt}" alt="delta {html.escape(name)}" width="100%">'
+                 for name in names if name != table.attrs['baseline']]
+        shown = table.rename(index=target_label, level='target')
+        page += [shown.to_html(na_rep='---', float_format=lambda x: f'{x:.2f}')]
+
+    page += ['<h2>RF modes</h2>', '<ul>'] + [f'<li><a href="#mode{rf_mode}">Mode {rf_mode}</a></li>' for rf_mode in by_mode] + ['</ul>']
+    for rf_mode, mode_data in by_mode.items():
+        page += [f'<h3 id="mode{rf_mode}">Mode {rf_mode}</h3>', f'<img src="ber_mode{rf_mode}.{fmt}" alt="BER mode {rf_mode}" width="60%">',
+                 '<table border="1"><tr><th>file</th><th>T1</th><th>BLF</th><th>RSSI histograms</th></tr>']
+        for each_data in mode_data:
+            name = html.escape(each_data.name_of_file)
+            if len(each_data.rssi_hists) and len(each_data.t1_rssi_hists):
+                rssi_link = f'<a href="rssi_{html.escape(os.path.splitext(each_data.name_of_file)[0])}.{fmt}">view</a>'
+            else:
+                rssi_link = '---' #RSSI not parsed
+            page += [f'<tr><td>{name}</td><td>{html.escape(each_data.t1_time)}</td><td>{html.escape(each_data.blf_err)}</td><td>{rssi_link}</td></tr>']
+        page += ['</table>']
+
+    page += ['</body></html>']
+    return '\n'.join(page)
+
+if __name__ == '__main__':
+    from summarize_data import ber_data_reader
+    from sensitivity_comp import sensitivities
+
+    master_data = ber_data_reader('test_data_7_good').read()
+    my_data = ber_data_reader('test_data').read()
+    print(render_report(my_data, 'report', sens_sets={'master': sensitivities(*master_data), 'mine': sensitivities(*my_data)}))
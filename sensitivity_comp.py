@@ -4,26 +4,29 @@ Created on Thu Sep 16 10:09:44 2021
 
 @author: thuang
 
-compares sensitivity between the data in two folders.
+compares sensitivity between the data in two folders (sens_comp), or in any
+number of folders against a baseline (sens_table).
 
 Two branches
 
 RF modes
 T1: min, nom, max
 LF: neg, nom, pos
-sensitivity: 1e-3, 1e-4
+sensitivity: 1e-3, 1e-4 by default, or any list of BER/PER targets
 
 """
 import numpy as np
+import pandas as pd
 from termcolor import colored
 import warnings
+from instrument import timed
+from summarize_data import as_sweeps
 
 def my_log_interp(y_pt, x, y):
     """
-    Performs linear interpolation of BER curves, but unlike the one in numpy,
-    this one scans the x-axis and finds the closest x, then moves back one point
-    and performs interpolation.  This has the advantage that even if y=f(x) is not
-    monotonically decreasing at lower BER, the x can still be computed.
+    Performs linear interpolation of one BER curve in log BER, after fitting
+    it to be monotonically decreasing with increasing power so the x can
+    still be computed where the measured curve is not.
     
     
     y_pt: float
@@ -35,27 +38,221 @@ def my_log_interp(y_pt, x, y):
     y: float
         BER in linear scale
     
+    return
+    ------
+    
+    x in dBm, NaN if the curve does not reach y_pt
+    
     """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    order = np.argsort(x, kind='stable')[::-1] #descending power, the order _interp_curves expects
+    log_ber, pow_dbm, n_points = _pack_points(np.zeros(len(x), dtype=int), x[order], y[order], 1)
+    sens, _ = _interp_curves(np.log10([y_pt]), log_ber, pow_dbm, n_points)
+    return sens[0, 0]
+    
 
-    zero_idx = y==0 #throw out all the data points where no bit errors are found so can take log
-    y = y[~zero_idx]
-    x = x[~zero_idx]
+#why a target is not reached by a curve, as returned by _interp_curves
+REACHED = 0
+BELOW_CURVE = 1 #target lower than the lowest error rate measured, e.g. an error floor
+ABOVE_CURVE = 2 #target higher than the highest error rate measured, the sweep starts at too high a power
+NO_ERRORS = 3 #no errors at any power level
+UNREACHED_REASONS = {BELOW_CURVE: 'below lowest error rate measured',
+                     ABOVE_CURVE: 'above highest error rate measured',
+                     NO_ERRORS: 'no errors measured'}
 
-    #sort by input power in ascending order, which is on the x-axis
-    idx_sorted = np.argsort(x)
-    x = x[idx_sorted]
-    y = y[idx_sorted]
+def target_label(target):
+    '''
+    Label of a BER/PER target as used in the printouts, e.g. 1e-3.
+    '''
+    return f'{target:.0e}'.replace('e-0', 'e-').replace('e+00', '')
 
-    idx_1 = next(best_y_idx for best_y_idx in range(len(y)) if y[best_y_idx] <= y_pt)
+def _pack_curves(data_obj, metric='ber'):
+    '''
+    Packs the BER (or PER if metric is 'per') curves of all data_obj into
+    padded 2-D arrays, one curve per row, in descending power so the BER of
+    each row is ascending.  Points with no errors are dropped so the log can
+    be taken.
+    
+    return
+    ------
+    
+    log10 BER or PER, NaN past the end of each curve
+    power in dBm, NaN past the end of each curve
+    number of points of each curve
+    
+    '''
+    rx_pow = np.concatenate([each_data_obj.rx_pow[::-1] for each_data_obj in data_obj])
+    ber = np.concatenate([getattr(each_data_obj, metric+'_curve')[::-1] for each_data_obj in data_obj])
+    row = np.repeat(np.arange(len(data_obj)), [len(each_data_obj.rx_pow) for each_data_obj in data_obj])
+    return _pack_points(row, rx_pow, ber, len(data_obj))
+
+def _pack_points(row, rx_pow, ber, n_rows):
+    '''
+    Packs the points of n_rows curves, given as the curve (row) of each point
+    in order of descending power, as described in _pack_curves.
+    '''
+    non_zero = ber > 0 #throw out all the data points where no bit errors are found so can take log
+    row, rx_pow, ber = row[non_zero], rx_pow[non_zero], ber[non_zero]
+    n_points = np.bincount(row, minlength=n_rows)
+    col = np.arange(len(row)) - np.repeat(np.cumsum(n_points) - n_points, n_points) #position of each point within its curve
+    
+    log_ber = np.full((n_rows, max(n_points.max(initial=0), 1)), np.nan)
+    pow_dbm = np.full(log_ber.shape, np.nan)
+    log_ber[row, col] = np.log10(ber)
+    pow_dbm[row, col] = rx_pow
+    return log_ber, pow_dbm, n_points
+
+def _monotone_fit(log_ber, n_points, block_size=2**20):
+    '''
+    Fits each packed curve to be non-decreasing in log BER (non-increasing
+    with power) by isotonic least squares.  A curve that is already
+    monotonic is returned unchanged; where a point breaks the order, it and
+    its neighbours are replaced by their mean.
+    
+    Uses the min-max form of the isotonic fit, where point i becomes
+    max over j < i of min over k >= i of the mean of points j..k-1, computed
+    from cumulative sums for a block of curves at a time.  The means of a
+    curve take (width+1)**2 values, so blocks are sized to hold about
+    block_size values and memory stays bounded however many curves there are.
+    '''
+    n_curves, width = log_ber.shape
+    block = max(1, block_size//(width+1)**2) #curves per block
+    if n_curves > block:
+        return np.concatenate([_monotone_fit(log_ber[start:start+block], n_points[start:start+block], block_size)
+                               for start in range(0, n_curves, block)])
+    
+    cumsum = np.zeros((n_curves, width+1))
+    cumsum[:, 1:] = np.cumsum(np.nan_to_num(log_ber), axis=1)
+    
+    edge = np.arange(width+1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (cumsum[:, None, :] - cumsum[:, :, None])/(edge[None, :] - edge[:, None]) #mean[c, j, k] of points j..k-1
+    mean[:, edge[:, None] >= edge[None, :]] = np.inf #empty ranges
+    mean = np.where(edge[None, None, :] > n_points[:, None, None], np.inf, mean) #ranges past the end of a curve
+    
+    min_after = np.minimum.accumulate(mean[:, :, ::-1], axis=2)[:, :, ::-1][:, :, 1:] #min over k >= i of mean[c, j, k], for i = 1..width
+    min_after[:, edge[:, None] >= edge[None, 1:]] = -np.inf #only j < i
+    fit = min_after.max(axis=1)
+    fit[np.isnan(log_ber)] = np.nan
+    return fit
 
-    x0, x1 = x[idx_1-1], x[idx_1]
-    y0, y1 = np.log10(y[idx_1-1]), np.log10(y[idx_1])
+def _interp_curves(log_target, log_ber, pow_dbm, n_points):
+    '''
+    Interpolates the power of every curve at every target, linear in log
+    BER between the two surrounding points, after fitting each curve to be
+    monotonic with _monotone_fit.  The surrounding points are found by one
+    np.searchsorted over all curves, each shifted into its own range of
+    values.
+    
+    parameters
+    ----------
+    log_target: array
+        log10 of the BER targets.
     
-    m = (y1-y0)/(x1-x0)
-    b = y1-m*x1
+    log_ber, pow_dbm, n_points: arrays
+        Curves packed by _pack_curves.
     
-    return (y_pt-b)/m
+    return
+    ------
+    
+    power in dBm of shape (number of curves, number of targets), NaN where
+    the target is not reached
     
+    reason each target is not reached, REACHED, BELOW_CURVE, ABOVE_CURVE or
+    NO_ERRORS, of the same shape
+    
+    '''
+    fit = _monotone_fit(log_ber, n_points)
+    n_curves, width = fit.shape
+    rows = np.arange(n_curves)[:, None]
+    
+    low = np.nanmin(fit, initial=0., where=~np.isnan(fit))
+    span = np.nanmax(fit, initial=0., where=~np.isnan(fit)) - low + 1. #values of each curve fit within one span
+    shifted = np.where(np.isnan(fit), span-.5, fit-low) + rows*span #padding sorts after the curve
+    shifted_target = np.clip(log_target[None, :]-low, -.25, span-.75) + rows*span
+    
+    idx = np.searchsorted(shifted.ravel(), shifted_target.ravel(), side='right').reshape(shifted_target.shape) - rows*width #points at or below each target
+    lo = np.clip(idx-1, 0, width-1)
+    hi = np.clip(np.minimum(idx, n_points[:, None]-1), 0, width-1)
+    
+    y0, y1 = fit[rows, lo], fit[rows, hi]
+    x0, x1 = pow_dbm[rows, lo], pow_dbm[rows, hi]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (x1 - x0)/(y1 - y0)
+        sens = np.where(lo == hi, x0, slope*(log_target[None, :] - y0) + x0)
+    
+    status = np.full(sens.shape, REACHED, dtype=np.int8)
+    status[idx == 0] = BELOW_CURVE
+    status[(idx >= n_points[:, None]) & (log_target[None, :] > y0)] = ABOVE_CURVE
+    status[n_points == 0] = NO_ERRORS
+    return np.where(status == REACHED, sens, np.nan), status
+
+def _sensitivity_batch(data_obj, targets=(1.e-3, 1.e-4), metric='ber'):
+    '''
+    Computes the sensitivity points of all data_obj at once.
+    
+    parameters
+    ----------
+    data_obj: list of ber_data instances
+    
+    targets: list of float
+        BER (or PER) of each sensitivity point.
+    
+    metric: str
+        'ber' or 'per', the curve the targets apply to.
+    
+    return
+    ------
+    
+    array of the power in dBm of shape (len(data_obj), len(targets)), NaN
+    where a target is not reached
+    
+    '''
+    return _sensitivity_status(data_obj, targets, metric)[0]
+
+@timed('sensitivity interpolation')
+def _sensitivity_status(data_obj, targets=(1.e-3, 1.e-4), metric='ber'):
+    '''
+    As _sensitivity_batch, also returning the reason each target is not
+    reached as described in _interp_curves.
+    '''
+    log_ber, pow_dbm, n_points = _pack_curves(data_obj, metric)
+    
+    not_monotonic = np.any(np.diff(log_ber, axis=1) <= 0, axis=1) #NaN padding compares False
+    for idx in np.flatnonzero(not_monotonic):
+        warnings.warn(f'Mode {data_obj[idx].rf_mode} {metric.upper()} not monotonically decreasing with increasing input signal power level, fitted to a monotonic curve')
+    
+    return _interp_curves(np.log10(np.asarray(targets, dtype=float)), log_ber, pow_dbm, n_points)
+
+def unreached_targets(*data_obj, targets=(1.e-3, 1.e-4), metric='ber'):
+    '''
+    Lists the targets that the BER (or PER) curves of data_obj do not reach,
+    which sensitivities gives as NaN.
+    
+    return
+    ------
+    
+    DataFrame with one row per curve and target not reached, with columns
+    name_of_file, rf_mode, T1, BLF, target and reason, one of the
+    UNREACHED_REASONS
+    
+    '''
+    data_obj = as_sweeps(data_obj)
+    columns = ['name_of_file', 'rf_mode', 'T1', 'BLF', 'target', 'reason']
+    if not data_obj:
+        return pd.DataFrame(columns=columns)
+    
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore') #non-monotonic curves are reported by sensitivities
+        status = _sensitivity_status(data_obj, targets, metric)[1]
+    curve, target = np.nonzero(status != REACHED)
+    return pd.DataFrame({'name_of_file': [data_obj[n].name_of_file for n in curve],
+                         'rf_mode': [data_obj[n].rf_mode for n in curve],
+                         'T1': [data_obj[n].t1_time for n in curve],
+                         'BLF': [data_obj[n].blf_err for n in curve],
+                         'target': np.asarray(targets, dtype=float)[target],
+                         'reason': [UNREACHED_REASONS[each] for each in status[curve, target]]}, columns=columns)
 
 def _sensitivity_calc(data_obj):
     '''
@@ -68,57 +265,150 @@ def _sensitivity_calc(data_obj):
     return
     ------
     
-    1e-3 point
-    1e-4 point where available
+    1e-3 point, NaN if not reached
+    1e-4 point, NaN if not reached
     
     '''
+    return tuple(_sensitivity_batch([data_obj])[0])
 
-    x = []
-    y = []
+@timed('bootstrap')
+def _bootstrap_batch(data_obj, targets=(1.e-3, 1.e-4), metric='ber', n_boot=1000, confidence=.95, seed=None, block_size=2**24):
+    '''
+    Confidence intervals of the sensitivity points of all data_obj at once,
+    by parametric bootstrap: the bit errors (or packet errors) of each power
+    level are redrawn n_boot times from a binomial distribution with the
+    measured BER (or PER) and number of bits (or packets), and each redrawn
+    curve is interpolated as in _sensitivity_batch.  All draws of all curves
+    are interpolated together, in blocks of draws sized so the monotonic
+    fit of a block holds about block_size values.
     
-    for k, v in data_obj.ber.items():
-        x += [k]; y+=[v]
-
-    x = np.array(x); y = np.array(y)
+    return
+    ------
     
-    zero_idx = y==0 #throw out all the data points where no bit errors are found so can take log
-    y = y[~zero_idx]
-    x = x[~zero_idx]
-
-    if not np.all(np.diff(y) > 0): warnings.warn(f'Mode {data_obj.rf_mode} BER not monotonically decreasing with increasing input signal power level')
+    array of shape (len(data_obj), len(targets), 2) holding the lower and
+    upper end of the interval in dBm, NaN where the target is not reached
+    in most draws
+    
+    '''
+    counts = 'n_bits' if metric == 'ber' else 'n_packets'
+    if any(len(getattr(each_data_obj, counts)) != len(each_data_obj.rx_pow) for each_data_obj in data_obj):
+        raise ValueError(f'the number of {counts[2:]} behind each point is needed for confidence intervals')
+    
+    rx_pow = np.concatenate([each_data_obj.rx_pow[::-1] for each_data_obj in data_obj])
+    rate = np.concatenate([getattr(each_data_obj, metric+'_curve')[::-1] for each_data_obj in data_obj])
+    n_trials = np.concatenate([getattr(each_data_obj, counts)[::-1] for each_data_obj in data_obj])
+    row = np.repeat(np.arange(len(data_obj)), [len(each_data_obj.rx_pow) for each_data_obj in data_obj])
+    log_target = np.log10(np.asarray(targets, dtype=float))
+    
+    rng = np.random.default_rng(seed)
+    width = max([len(each_data_obj.rx_pow) for each_data_obj in data_obj], default=0) + 1
+    block = max(1, block_size//max(len(rate)*width, 1)) #draws per block, _monotone_fit takes width values per point
+    sens = []
+    for start in range(0, n_boot, block):
+        n_draws = min(block, n_boot-start)
+        redrawn = rng.binomial(n_trials, rate, size=(n_draws, len(rate)))/np.maximum(n_trials, 1)
+        draw_row = (np.arange(n_draws)[:, None]*len(data_obj) + row).ravel() #one packed curve per draw and data_obj
+        packed = _pack_points(draw_row, np.tile(rx_pow, n_draws), redrawn.ravel(), n_draws*len(data_obj))
+        sens += [_interp_curves(log_target, *packed)[0].reshape(n_draws, len(data_obj), len(targets))]
+    sens = np.concatenate(sens)
+    
+    tail = (1-confidence)/2
+    interval = np.nanquantile(sens, [tail, 1-tail], axis=0) if len(sens) else np.full((2, len(data_obj), len(targets)), np.nan)
+    interval[:, np.isnan(sens).mean(axis=0) > .5] = np.nan #not reached in most draws
+    return np.moveaxis(interval, 0, -1)
 
-    idx_sorted = np.argsort(x)[::-1]
-    x = x[idx_sorted]
-    y = np.log10(y[idx_sorted])
+def sensitivity_intervals(*data_obj, targets=(1.e-3, 1.e-4), metric='ber', n_boot=1000, confidence=.95, seed=None):
+    '''
+    Computes confidence intervals of the sensitivity points of all data_obj,
+    accounting for the finite number of bits and packets behind each point
+    of the BER (or PER) curves.
+    
+    parameters
+    ----------
+    data_obj: ber_data instances, or a sweep_collection
     
-    if y[0] <= 1.e-3:
-        e_3 = np.interp(-3, y, x)
-    if y[0] <= 1.e-4:
-        e_4 = np.interp(-4, y, x)
-        return e_3, e_4
+    targets, metric:
+        As in sensitivities
+    
+    n_boot: int
+        Number of bootstrap draws of each curve
+    
+    confidence: float
+        Probability the sensitivity lies within its interval
+    
+    seed: int or None
+        Seed of the random draws, for repeatable intervals
+    
+    return
+    ------
+    
+    {'targets': targets, 'confidence': confidence, rf_mode: {t1_blf: ((low, high) at each target)}}
+    laid out as returned by sensitivities, NaN for targets a curve does not reach
+    
+    '''
+    data_obj = as_sweeps(data_obj)
+    interval_dict = {'targets': list(targets), 'confidence': confidence}
     
-    return (e_3,'--')
+    if not data_obj:
+        return interval_dict
+    
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) #all-NaN quantiles of targets never reached
+        intervals = _bootstrap_batch(data_obj, targets, metric, n_boot, confidence, seed)
+    
+    for each_data_obj, each_interval in zip(data_obj, intervals):
+        interval_dict.setdefault(each_data_obj.rf_mode, {})
+        interval_dict[each_data_obj.rf_mode][each_data_obj.t1_time + '_' + each_data_obj.blf_err] = tuple(map(tuple, each_interval))
+    
+    return interval_dict
 
-def sensitivities(*data_obj):
+def sensitivities(*data_obj, targets=(1.e-3, 1.e-4), metric='ber'):
+    '''
+    Computes the sensitivity points of all data_obj in one pass.
+    
+    parameters
+    ----------
+    data_obj: ber_data instances, or a sweep_collection
+    
+    targets: list of float
+        BER (or PER) of each sensitivity point, e.g. [1e-2, 1e-3, 1e-4, 1e-5, 1e-6].
     
-    sens_dict = {} #dictionary with sensitivity data
+    metric: str
+        'ber' or 'per', the curve the targets apply to.
     
-    for each_data_obj in data_obj:
+    return
+    ------
+    
+    {'targets': targets, rf_mode: {t1_blf: (sensitivity at each target)}}
+    with NaN for the targets a curve does not reach
+    
+    '''
+    data_obj = as_sweeps(data_obj)
+    sens_dict = {'targets': list(targets)} #dictionary with sensitivity data
+    
+    if not data_obj:
+        return sens_dict
+    
+    for each_data_obj, each_sens in zip(data_obj, _sensitivity_batch(data_obj, targets, metric)):
         inner_key = each_data_obj.t1_time + '_' + each_data_obj.blf_err
         sens_dict.setdefault(each_data_obj.rf_mode, {})
-        sens_dict[each_data_obj.rf_mode][inner_key] = _sensitivity_calc(each_data_obj)
+        sens_dict[each_data_obj.rf_mode][inner_key] = tuple(each_sens)
 
     return sens_dict
 
+def _sens_str(sens):
+    return '---' if np.isnan(sens) else f'{sens:.2f}'
+
 def sens_disp(dict1, t1=['min','nom','max'], blf=['neg','nom','pos']):
     '''
-    Displays the 1e-3 and 1e-4 sensitivity points. 
+    Displays the sensitivity points. 
     
     parameters
     ----------
     
     dict1: dictionary
-        Holds (1e-3, 1e-4) sensitivity numbers in dB
+        Holds the sensitivity numbers in dB at each of dict1['targets'], as
+        returned by sensitivities
 
     t1: list
         T1 settings of sensitivity points to display.
@@ -127,8 +417,11 @@ def sens_disp(dict1, t1=['min','nom','max'], blf=['neg','nom','pos']):
         BLF error settings of sensitivyt points to display.
 
     '''
+    targets = dict1.get('targets', [1.e-3, 1.e-4])
     
     for rf_mode in dict1.keys():
+        if rf_mode == 'targets':
+            continue
         print('___________________________')
         print(f'RF Mode: {rf_mode}')
         
@@ -136,33 +429,27 @@ def sens_disp(dict1, t1=['min','nom','max'], blf=['neg','nom','pos']):
           for each_blf in blf:
             t1_blf_key = each_t1+'_'+each_blf
 
-            if rf_mode in dict1.keys():
-                if t1_blf_key in dict1[rf_mode].keys():
-                    e3_d1, e4_d1 = dict1[rf_mode][t1_blf_key]
-                else:
-                    e3_d1, e4_d1 = '--', '--'
-                    continue
+            if t1_blf_key not in dict1[rf_mode].keys():
+                continue
                 
             print(f'T1: {each_t1}, BLF: {each_blf}')
-            print('sensitivity: '.ljust(6), '1e-3'.ljust(7), '1e-4'.ljust(7))
-            
-            if e4_d1 == '--':
-                print(f'{e3_d1:.2f}'.rjust(19), '---'.ljust(7))
-            else:
-                print(f'{e3_d1:.2f}'.rjust(19), f'{e4_d1:.2f}'.ljust(7))
+            print('sensitivity: '.ljust(12), *[target_label(target).ljust(7) for target in targets])
+            print(''.ljust(12), *[_sens_str(sens).ljust(7) for sens in dict1[rf_mode][t1_blf_key]])
 
-def sens_comp(dict1, dict2, name1='data1', name2='data2', tolerance_db=.5, t1=['min','nom','max'], blf=['neg','nom','pos']):
+def sens_comp(dict1, dict2, name1='data1', name2='data2', tolerance_db=.5, t1=['min','nom','max'], blf=['neg','nom','pos'], intervals1=None, intervals2=None):
     '''
-    Compares two sensitivity dictionaries.
+    Compares two sensitivity dictionaries and prints the comparison, as
+    sens_comp_disp.  sens_comp_dict gives the same result without printing.
     
     parameters
     ----------
     
     dict1: dictionary
-        Holds (1e-3, 1e-4) sensitivity numbers in dB
+        Holds the sensitivity numbers in dB at each of dict1['targets'], as
+        returned by sensitivities
     
     dict2: dictionary
-        Holds (1e-3, 1e-4) sensitivity numbers in dB
+        Holds the sensitivity numbers in dB at the same targets as dict1
     
     name1: str
         Name of the first data set
@@ -178,75 +465,192 @@ def sens_comp(dict1, dict2, name1='data1', name2='data2', tolerance_db=.5, t1=['
     
     blf: list
         BLF error settings for which comparisons are made
+    
+    intervals1, intervals2: dictionary
+        Confidence intervals of dict1 and dict2 as returned by
+        sensitivity_intervals.  When given, a delta beyond tolerance_db is
+        only flagged where the intervals do not overlap, so differences
+        within the noise of the packet counts are not reported.
+    
+    return
+    ------
+    
+    {'names':[name1, name2], 'targets':targets, mode_id:{t1_blf:{'T1': t1, 'BLF': blf, 'name1':[...], 'name2':[...], 'delta':[...]}}}
+    with one entry per target in each list, NaN where a target is not reached.
+    With intervals, the entries also hold 'name1_ci' and 'name2_ci', a (low, high) per target,
+    and 'regression', True where flagged.
         
     '''
+    data_dict = sens_comp_dict(dict1, dict2, name1, name2, tolerance_db, t1, blf, intervals1, intervals2)
+    sens_comp_disp(data_dict, tolerance_db)
+    return data_dict
+
+def sens_comp_dict(dict1, dict2, name1='data1', name2='data2', tolerance_db=.5, t1=['min','nom','max'], blf=['neg','nom','pos'], intervals1=None, intervals2=None):
+    '''
+    Compares two sensitivity dictionaries as sens_comp does, without
+    printing.
+    '''
+    targets = dict1.get('targets', [1.e-3, 1.e-4])
+    if list(dict2.get('targets', [1.e-3, 1.e-4])) != list(targets):
+        raise ValueError('dict1 and dict2 hold sensitivities at different targets')
     
-    t1_blf_semaphore = True
-    
-    all_rf_modes = set.union(set(dict1.keys()), set(dict2.keys())) #all the unique RF modes
-    data_dict = {'names':[name1, name2]}
+    all_rf_modes = set.union(set(dict1.keys()), set(dict2.keys())) - {'targets'} #all the unique RF modes
+    data_dict = {'names':[name1, name2], 'targets':list(targets)}
     
     for rf_mode in all_rf_modes:
-        print('___________________________')
-        print(f'RF Mode: {rf_mode}')
-        
         for each_t1 in t1:
           for each_blf in blf:
             t1_blf_key = each_t1+'_'+each_blf
 
-            if rf_mode in dict1.keys():
-                if t1_blf_key in dict1[rf_mode].keys():
-                    t1_blf_semaphore = True
-                    e3_d1, e4_d1 = dict1[rf_mode][t1_blf_key]
-                else:
-                    t1_blf_semaphore = False
-            else:
-                t1_blf_semaphore = False
-                e3_d1, e4_d1 = '--', '--'
-                
-            if rf_mode in dict2.keys():
-                if t1_blf_key in dict2[rf_mode].keys():
-                    t1_blf_semaphore = t1_blf_semaphore and True
-                    e3_d2, e4_d2 = dict2[rf_mode][t1_blf_key]
-                else:
-                    t1_blf_semaphore = False
-            else:
-                t1_blf_semaphore = False
-                e3_d2, e4_d2 = '--', '--'             
-                
-            if t1_blf_semaphore: #if both data sets have this combination of T1 and BLF fields for this RF mode
-                print(f'T1: {each_t1}, BLF: {each_blf}')
-                print('sensitivity: '.ljust(6), '1e-3'.ljust(7), '1e-4'.ljust(7))
-
-                delta_e3 = e3_d1 - e3_d2
-                delta_e3_color = 'green' if delta_e3 >= -tolerance_db else 'red'
-                
-                if e4_d1 == '--' or e4_d2 == '--':
-                    print(f'{name1}: '.ljust(12), f'{e3_d1:.2f}'.ljust(7), '---'.ljust(7))
-                    print(f'{name2}: '.ljust(12), f'{e3_d2:.2f}'.ljust(7), '---'.ljust(7))                    
-                    print('delta: '.ljust(12), colored(f'{delta_e3:.2f}'.ljust(7), delta_e3_color), '---'.ljust(7))
-                else:
-                    delta_e4 = e4_d1 - e4_d2
-                    delta_e4_color = 'green' if delta_e4 >= -tolerance_db else 'red'
-                    print(f'{name1}: '.ljust(12), f'{e3_d1:.2f}'.ljust(7), f'{e4_d1:.2f}'.ljust(7))
-                    print(f'{name2}: '.ljust(12), f'{e3_d2:.2f}'.ljust(7), f'{e4_d2:.2f}'.ljust(7))    
-                    print('delta: '.ljust(12), colored(f'{delta_e3:.2f}'.ljust(7), delta_e3_color), colored(f'{delta_e4:.2f}'.ljust(7), delta_e4_color))
-
-                data_dict.setdefault(rf_mode, {})
-                data_dict[rf_mode].setdefault(t1_blf_key, {'T1': each_t1, 
-                                                           'BLF':each_blf, 
-                                                           'name1':[e3_d1, e4_d1], 
-                                                           'name2':[e3_d2, e4_d2],
-                                                           'delta':[delta_e3, delta_e4]})
+            if t1_blf_key not in dict1.get(rf_mode, {}) or t1_blf_key not in dict2.get(rf_mode, {}):
+                continue #both data sets need this combination of T1 and BLF fields for this RF mode
+            
+            sens_d1 = np.array(dict1[rf_mode][t1_blf_key], dtype=float)
+            sens_d2 = np.array(dict2[rf_mode][t1_blf_key], dtype=float)
+            delta = sens_d1 - sens_d2 #NaN where either is not reached
+            
+            data_dict.setdefault(rf_mode, {})
+            data_dict[rf_mode].setdefault(t1_blf_key, {'T1': each_t1, 
+                                                       'BLF':each_blf, 
+                                                       'name1':list(sens_d1), 
+                                                       'name2':list(sens_d2),
+                                                       'delta':list(delta)})
+            if intervals1 is not None and intervals2 is not None:
+                ci_d1 = np.array(intervals1[rf_mode][t1_blf_key], dtype=float)
+                ci_d2 = np.array(intervals2[rf_mode][t1_blf_key], dtype=float)
+                regression = (delta < -tolerance_db) & (ci_d2[:, 0] > ci_d1[:, 1]) #data set 2 worse beyond the noise of both
+                data_dict[rf_mode][t1_blf_key]['regression'] = list(regression)
+                data_dict[rf_mode][t1_blf_key]['name1_ci'] = [tuple(each_ci) for each_ci in ci_d1]
+                data_dict[rf_mode][t1_blf_key]['name2_ci'] = [tuple(each_ci) for each_ci in ci_d2]
     return data_dict
 
+def sens_comp_disp(data_dict, tolerance_db=.5):
+    '''
+    Prints a comparison from sens_comp_dict, with the deltas flagged as a
+    regression in red: those in 'regression' when the comparison holds
+    confidence intervals, otherwise those worse than tolerance_db.
+    '''
+    name1, name2 = data_dict['names']
+    targets = data_dict['targets']
+    for rf_mode, mode_dict in data_dict.items():
+        if rf_mode in ('names', 'targets'):
+            continue
+        print('___________________________')
+        print(f'RF Mode: {rf_mode}')
+        
+        for t1_blf_key, comp in mode_dict.items():
+            delta = np.array(comp['delta'], dtype=float)
+            regression = comp['regression'] if 'regression' in comp else delta < -tolerance_db
+            delta_color = ['red' if each_regression else 'green' for each_regression in regression]
+            
+            print(f'T1: {comp["T1"]}, BLF: {comp["BLF"]}')
+            print('sensitivity: '.ljust(12), *[target_label(target).ljust(7) for target in targets])
+            print(f'{name1}: '.ljust(12), *[_sens_str(sens).ljust(7) for sens in comp['name1']])
+            print(f'{name2}: '.ljust(12), *[_sens_str(sens).ljust(7) for sens in comp['name2']])
+            if 'name1_ci' in comp:
+                for name, ci in [(name1, comp['name1_ci']), (name2, comp['name2_ci'])]:
+                    print(f'{name} CI: '.ljust(12), *[f'{_sens_str(low)}..{_sens_str(high)}'.ljust(15) for low, high in ci])
+            print('delta: '.ljust(12), *[colored(_sens_str(each_delta).ljust(7), color) for each_delta, color in zip(delta, delta_color)])
+
+def sens_table(sens_sets, baseline=None, tolerance_db=.5, t1=['min','nom','max'], blf=['neg','nom','pos']):
+    '''
+    Compares any number of sensitivity dictionaries against a baseline and
+    returns the result as one table, without printing.  Use sens_table_disp
+    to print it.
+    
+    parameters
+    ----------
+    
+    sens_sets: dictionary
+        {name: sensitivity dictionary as returned by sensitivities}, all
+        computed at the same targets.  The order of the names is kept.
+    
+    baseline: str
+        Name of the data set the others are compared against, the first one
+        if None
+    
+    tolerance_db: float
+        A data set is flagged as a regression where its sensitivity is worse
+        than the baseline's by more than this many dB
+    
+    t1: list
+        T1 settings for which comparisons are made
+    
+    blf: list
+        BLF error settings for which comparisons are made
+    
+    return
+    ------
+    
+    DataFrame indexed by (rf_mode, T1, BLF, target) with columns
+    ('sens', name) the sensitivity in dBm of each data set,
+    ('delta', name) the baseline minus that data set, as in sens_comp, and
+    ('regression', name) True where delta < -tolerance_db.
+    Combinations missing from a data set and targets not reached are NaN.
+    
+    '''
+    names = list(sens_sets.keys())
+    baseline = names[0] if baseline is None else baseline
+    targets = list(sens_sets[baseline].get('targets', [1.e-3, 1.e-4]))
+    if any(list(sens_dict.get('targets', [1.e-3, 1.e-4])) != targets for sens_dict in sens_sets.values()):
+        raise ValueError('all data sets must hold sensitivities at the same targets')
+    
+    records = [(name, rf_mode, *t1_blf.split('_'), sens)
+               for name, sens_dict in sens_sets.items()
+               for rf_mode, sens_by_t1_blf in sens_dict.items() if rf_mode != 'targets'
+               for t1_blf, sens in sens_by_t1_blf.items()]
+    run, rf_mode, each_t1, each_blf, sens = zip(*records) if records else ([],)*5
+    sens = np.array(sens, dtype=float).reshape(len(records), len(targets))
+    
+    long_table = pd.DataFrame({'run': np.repeat(run, len(targets)),
+                               'rf_mode': np.repeat(rf_mode, len(targets)),
+                               'T1': pd.Categorical(np.repeat(each_t1, len(targets)), categories=t1), #rows follow the order of t1, blf and targets
+                               'BLF': pd.Categorical(np.repeat(each_blf, len(targets)), categories=blf),
+                               'target': pd.Categorical(np.tile(targets, len(records)), categories=targets),
+                               'sens': sens.ravel()})
+    long_table = long_table.dropna(subset=['T1', 'BLF']) #T1 and BLF settings not requested
+    
+    sens = long_table.set_index(['rf_mode', 'T1', 'BLF', 'target', 'run'])['sens'].unstack('run').reindex(columns=names)
+    delta = sens.rsub(sens[baseline], axis=0) #baseline - each data set
+    table = pd.concat({'sens': sens, 'delta': delta, 'regression': delta < -tolerance_db}, axis=1)
+    table.attrs['baseline'] = baseline
+    table.attrs['tolerance_db'] = tolerance_db
+    return table
+
+def sens_table_disp(table):
+    '''
+    Prints a table from sens_table in the layout of sens_comp, with the
+    delta of each data set against the baseline in red where it is flagged
+    as a regression.
+    '''
+    baseline = table.attrs.get('baseline')
+    names = list(table['sens'].columns)
+    
+    for rf_mode, mode_table in table.groupby(level='rf_mode', sort=False):
+        print('___________________________')
+        print(f'RF Mode: {rf_mode}')
+        
+        for (each_t1, each_blf), setting_table in mode_table.groupby(level=['T1', 'BLF'], sort=False):
+            targets = setting_table.index.get_level_values('target')
+            print(f'T1: {each_t1}, BLF: {each_blf}')
+            print('sensitivity: '.ljust(12), *[target_label(target).ljust(7) for target in targets])
+            for name in names:
+                print(f'{name}: '.ljust(12), *[_sens_str(sens).ljust(7) for sens in setting_table['sens', name]])
+            for name in names:
+                if name == baseline:
+                    continue
+                print(f'delta {name}: '.ljust(12), *[colored(_sens_str(each_delta).ljust(7), 'red' if regression else 'green')
+                                                    for each_delta, regression in zip(setting_table['delta', name], setting_table['regression', name])])
+
 if __name__ == '__main__':
     from summarize_data import ber_data_reader
+    from async_read import read_folders
     from plot_ber_delta import delta_bars
     from matplotlib import pyplot as plt
     # from write_excel import write_excel as we
-    my_branch_dict = sensitivities(*ber_data_reader('test_data_all').read())
-    master_branch_dict = sensitivities(*ber_data_reader('test_data').read())
+    sweeps = read_folders(['test_data_all', 'test_data'])
+    my_branch_dict = sensitivities(sweeps['test_data_all'])
+    master_branch_dict = sensitivities(sweeps['test_data'])
     data_dict=sens_comp(master_branch_dict, my_branch_dict, name1='master', name2='mine', tolerance_db=.5)
     # write_workbook = we('comparisons', data_dict)
     # write_workbook.write_modes()
@@ -7,19 +7,251 @@ Created on Tue Jul 13 12:44:37 2021
 Script to summarize and visualize data collected for TXRX sync work.
 """
 import pandas as pd
+import io
 import os
-from matplotlib import pyplot as plt
+import warnings
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from termcolor import colored
+from instrument import profiler, timed, init_worker
+from capture_file import CAPTURE_EXTENSION, capture_file
+from link_budget import DEFAULT_BUDGET
 
-class ber_data:
+# column types of the capture CSV files
+CSV_DTYPES = {'test_comment': str,
+              'rf_mode': float,
+              'freq_mhz': float,
+              't1_time': str,
+              'blf_err': str,
+              'tx_power': int,
+              'region': str,
+              'bits/packet': int,
+              'packets': int,
+              'end_to_end_loss': float,
+              'delayed': bool,
+              'delayed_reply': bool,
+              'delimiter_only': bool,
+              'timestamp': int,
+              'attenuation': float,
+              'residue_i': int,
+              'residue_q': int,
+              'cdac_i': int,
+              'cdac_q': int,
+              'packet_num': int,
+              'rssi': int,
+              'rf_phase': int,
+              'n_bit_err': int,
+              'rx_bits': str,
+              'tx_bits': str,
+              'xor_bits': str,
+              'dft_peak': bool,
+              'dft_preamble_detected': bool,
+              'agc_y_expo': int,
+              'agc_y_mant': int,
+              'dft_peak_bin': int,
+              'pmf_eop_idx': int,
+              'slot_num': int,
+              'bd_pm_max': int,
+              'bd_pm_min': int,
+              't1_rssi': int,
+              'pmf_eop_val': int,
+              'dft_peak_mag': int,
+              'dft_preamble_detect_idx': int,
+              'tx_start': int,
+              'rx_stop': int}
+
+# columns holding the test settings, which are the same on every row of a file
+HEADER_COLUMNS = ['rf_mode', 't1_time', 'freq_mhz', 'tx_power_dbm', 'region', 'end_to_end_loss', 'blf_err']
+
+# per-packet columns parsed for each column profile of ber_data_reader, None parses all columns
+COLUMN_PROFILES = {'ber': ['attenuation', 'n_bit_err', 'bits/packet'],
+                   'rssi': ['attenuation', 'n_bit_err', 'bits/packet', 'rssi', 't1_rssi'],
+                   'full': None}
+
+# test settings that identify a sweep in a sweep_collection
+SWEEP_KEY = ['rf_mode', 't1_time', 'blf_err', 'freq_mhz', 'region', 'tx_power_dbm']
+
+CACHE_FOLDER = '.ber_cache' #folder created inside the data folder to hold the parsed captures
+CACHE_VERSION = 7 #bump when the layout of the cache files changes
+
+class rssi_histogram:
+    '''
+    Counts of integer RSSI readings with one bin per register value, built
+    up incrementally so readings never need to be held in memory together.
+    np.asarray(hist), hist.values and iterating give back the readings in
+    ascending order and len(hist) their number, as from the pandas Series
+    of readings this replaces.
+    '''
+    def __init__(self, first=0, counts=None):
+        '''
+        first: int
+            RSSI value counted in the first bin.
+        
+        counts: array of int
+            Number of readings of each RSSI value from first upwards.
+        '''
+        self.first = int(first)
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
     
-    def __init__(self, name_of_data):
+    def add(self, readings):
+        '''
+        Counts the RSSI readings, widening the range of bins as needed.
+        '''
+        readings = np.asarray(readings, dtype=np.int64)
+        if len(readings):
+            first = int(readings.min())
+            self.add_counts(first, np.bincount(readings-first))
+    
+    def add_counts(self, first, counts):
         '''
-        Data object storing data collected in a BER test as read from a CSV file.
-        The BER for each power level is stored in the ber dictionary, with
-        the power level in dB as key and the BER as value.
+        Adds the counts of another histogram starting at RSSI value first.
         '''
+        if len(counts) == 0:
+            return
+        if len(self.counts) == 0:
+            self.first, self.counts = int(first), np.array(counts, dtype=np.int64)
+            return
+        
+        new_first = min(self.first, int(first))
+        new_counts = np.zeros(max(self.first+len(self.counts), first+len(counts)) - new_first, dtype=np.int64)
+        new_counts[self.first-new_first:self.first-new_first+len(self.counts)] += self.counts
+        new_counts[first-new_first:first-new_first+len(counts)] += counts
+        self.first, self.counts = new_first, new_counts
+    
+    @property
+    def bins(self):
+        '''
+        RSSI value of each bin.
+        '''
+        return np.arange(self.first, self.first+len(self.counts))
+    
+    def readings(self):
+        '''
+        The counted readings in ascending order.
+        '''
+        return np.repeat(self.bins, self.counts)
+    
+    @property
+    def values(self):
+        '''
+        The readings, as Series.values gave them.
+        '''
+        return self.readings()
+    
+    def __array__(self, dtype=None, copy=None):
+        return self.readings() if dtype is None else self.readings().astype(dtype)
+    
+    def __iter__(self):
+        return iter(self.readings())
+    
+    def __len__(self):
+        return self.count()
+    
+    def count(self):
+        return int(self.counts.sum())
+    
+    def mean(self, axis=None, dtype=None, out=None, **kwargs):
+        '''
+        Mean of the readings.  The arguments are those np.mean passes on and
+        are ignored, as the readings are one dimensional.
+        '''
+        return (self.bins*self.counts).sum()/self.count()
+    
+    def var(self, axis=None, dtype=None, out=None, ddof=1, **kwargs):
+        '''
+        Variance of the readings, with the same default ddof as pandas.
+        np.var passes ddof=0, as it does to a Series.
+        '''
+        deviation = self.bins - self.mean()
+        return (deviation**2*self.counts).sum()/(self.count()-ddof)
+    
+    def std(self, axis=None, dtype=None, out=None, ddof=1, **kwargs):
+        '''
+        Standard deviation of the readings, as var.
+        '''
+        return np.sqrt(self.var(ddof=ddof))
+
+class histogram_set:
+    '''
+    RSSI histograms of all power levels of a sweep, stored end to end: the
+    counts of power level n are counts[offsets[n]:offsets[n+1]], one bin per
+    RSSI value from first[n] upwards.  The mean and variance (ddof=1) of the
+    readings of each power level are kept alongside.
+    '''
+    __slots__ = ('first', 'counts', 'offsets', 'mean', 'var')
+    
+    def __init__(self, first=(), counts=(), offsets=(0,)):
+        self.first = np.asarray(first, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        
+        n_bins = np.diff(self.offsets)
+        power_level = np.repeat(np.arange(len(self.first)), n_bins)
+        values = self.first[power_level] + np.arange(len(self.counts)) - self.offsets[power_level]
+        n_readings = np.bincount(power_level, weights=self.counts, minlength=len(self.first))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.mean = np.bincount(power_level, weights=values*self.counts, minlength=len(self.first))/n_readings
+            self.var = np.bincount(power_level, weights=(values-self.mean[power_level])**2*self.counts, minlength=len(self.first))/(n_readings-1)
+    
+    @classmethod
+    def from_histograms(cls, hists):
+        '''
+        Packs a list of rssi_histogram, one per power level.
+        '''
+        return cls([hist.first for hist in hists],
+                   np.concatenate([hist.counts for hist in hists] + [np.zeros(0, dtype=np.int64)]),
+                   np.concatenate([[0], np.cumsum([len(hist.counts) for hist in hists], dtype=np.int64)]))
+    
+    def __len__(self):
+        return len(self.first)
+    
+    def __getitem__(self, n):
+        return rssi_histogram(self.first[n], self.counts[self.offsets[n]:self.offsets[n+1]])
+
+class power_view(Mapping):
+    '''
+    Read-only dictionary view of one quantity of a ber_data, with the power
+    level in dB as key.  Power levels are in ascending order.
+    '''
+    __slots__ = ('rx_pow', '_values')
+    
+    def __init__(self, rx_pow, values):
+        self.rx_pow = rx_pow
+        self._values = values
+    
+    def _index(self, rx_pow):
+        idx = np.searchsorted(self.rx_pow, rx_pow)
+        if idx < len(self) and self.rx_pow[idx] == rx_pow:
+            return idx
+        raise KeyError(rx_pow)
+    
+    def __getitem__(self, rx_pow):
+        return self._values[self._index(rx_pow)]
+    
+    def __iter__(self):
+        return iter(self.rx_pow[:len(self)])
+    
+    def __len__(self):
+        return min(len(self.rx_pow), len(self._values)) #RSSI views are empty if the RSSI was not read
+    
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+class ber_data:
+    '''
+    Data object storing data collected in a BER test as read from a CSV file.
+    The power levels in dB are held in ascending order in rx_pow, with the
+    BER, PER, number of bits and packets, and RSSI histograms of each power
+    level in arrays of the same order, and the attenuator setting each was
+    measured at in atten.  The ber, per, rssi and t1_rssi dictionaries are read-only views
+    of these arrays with the power level as key, rssi and t1_rssi giving an
+    rssi_histogram per power level.
+    '''
+    __slots__ = ('name_of_file', 'rf_mode', 't1_time', 'freq_mhz', 'blf_err', 'tx_power_dbm', 'region', 'end_to_end_loss',
+                 'rx_pow', 'atten', 'ber_curve', 'per_curve', 'n_bits', 'n_packets', 'rssi_hists', 't1_rssi_hists')
+    
+    def __init__(self, name_of_data):
         self.name_of_file = name_of_data
         self.rf_mode = 11
         self.t1_time = 'nom'
@@ -28,121 +260,569 @@ class ber_data:
         self.tx_power_dbm = 30
         self.region = 'fcc'
         self.end_to_end_loss = 78.18
-        self.ber = dict()
-        self.per = dict()
-        self.rssi = dict()
-        self.t1_rssi = dict()
+        self.set_curves([], [], [])
+    
+    def set_curves(self, rx_pow, ber, per, rssi=None, t1_rssi=None, n_bits=None, n_packets=None, atten=None):
+        '''
+        Stores the BER, PER and RSSI of each power level, sorting everything
+        by ascending power once so users of the arrays need not sort again.
+        
+        rx_pow, ber, per: array of float
+            Power level in dB and its BER and PER.
+        
+        rssi, t1_rssi: list of rssi_histogram
+            Post-T1 and pre-T1 RSSI histograms of each power level.
+        
+        n_bits, n_packets: array of int
+            Number of bits and packets behind the BER and PER of each power
+            level, which set how far the BER and PER can be trusted.
+        
+        atten: array of float
+            Attenuator setting of each power level, from which a link_budget
+            gives rx_pow.
+        '''
+        order = np.argsort(rx_pow, kind='stable')
+        self.rx_pow = np.asarray(rx_pow, dtype=float)[order]
+        self.atten = np.asarray(atten, dtype=float)[order] if atten is not None else np.zeros(0)
+        self.ber_curve = np.asarray(ber, dtype=float)[order]
+        self.per_curve = np.asarray(per, dtype=float)[order]
+        self.n_bits = np.asarray(n_bits, dtype=np.int64)[order] if n_bits is not None else np.zeros(0, dtype=np.int64)
+        self.n_packets = np.asarray(n_packets, dtype=np.int64)[order] if n_packets is not None else np.zeros(0, dtype=np.int64)
+        self.rssi_hists = histogram_set.from_histograms([rssi[n] for n in order] if rssi else [])
+        self.t1_rssi_hists = histogram_set.from_histograms([t1_rssi[n] for n in order] if t1_rssi else [])
+    
+    def fill_header(self, header_pd):
+        '''
+        Sets the test settings from the first row of header_pd, which holds
+        the HEADER_COLUMNS of a capture.
+        '''
+        self.rf_mode = int(header_pd['rf_mode'].iloc[0])
+        self.t1_time = header_pd['t1_time'].iloc[0]
+        self.freq_mhz = header_pd['freq_mhz'].iloc[0]
+        self.tx_power_dbm = header_pd['tx_power_dbm'].iloc[0]
+        self.region = header_pd['region'].iloc[0]
+        self.end_to_end_loss = header_pd['end_to_end_loss'].iloc[0]
+        self.blf_err = header_pd['blf_err'].iloc[0]
+    
+    @property
+    def ber(self):
+        return power_view(self.rx_pow, self.ber_curve)
+    
+    @property
+    def per(self):
+        return power_view(self.rx_pow, self.per_curve)
+    
+    @property
+    def rssi(self):
+        return power_view(self.rx_pow, self.rssi_hists)
+    
+    @property
+    def t1_rssi(self):
+        return power_view(self.rx_pow, self.t1_rssi_hists)
+    
+    def rssi_means(self, pre_t1=False):
+        '''
+        Mean post-T1 RSSI, or pre-T1 RSSI if pre_t1, of each power level in
+        rx_pow.
+        '''
+        return (self.t1_rssi_hists if pre_t1 else self.rssi_hists).mean
+
+class sweep_collection(Sequence):
+    '''
+    Sweeps indexed by their test settings in SWEEP_KEY, built once after
+    reading so the analysis and plotting functions need not regroup them.
+    
+    A sweep_collection is a sequence of ber_data in the order given, and can
+    be passed in place of the data objects to every function taking
+    *data_obj.  Indexing with a slice or an array of positions or booleans
+    gives a sweep_collection of those sweeps.
+    
+        sweeps = ber_data_reader('test_data').read_sweeps()
+        sweeps.find(rf_mode=120, t1_time='min', blf_err='nom')
+        sweeps.select(rf_mode=[11, 120], t1_time='nom')
+        sweeps.groupby('rf_mode')
+    '''
+    __slots__ = ('sweeps', 'keys', '_groups')
+    
+    def __init__(self, data_obj=()):
+        self.sweeps = list(data_obj)
+        self.keys = pd.DataFrame({field: pd.Series([getattr(each_data, field) for each_data in self.sweeps], dtype=object)
+                                  for field in SWEEP_KEY}) #one row per sweep
+        self._groups = dict() #fields -> {value(s) of the fields: positions}, built on first use
     
+    def __len__(self):
+        return len(self.sweeps)
+    
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return sweep_collection(self.sweeps[n])
+        if np.ndim(n):
+            n = np.asarray(n)
+            return sweep_collection([self.sweeps[each] for each in (np.flatnonzero(n) if n.dtype == bool else n)])
+        return self.sweeps[n]
+    
+    def __repr__(self):
+        return f'sweep_collection of {len(self)} sweeps'
+    
+    def _positions(self, fields):
+        '''
+        Positions of the sweeps of each value of fields, in order of first
+        appearance.  Built once per combination of fields.
+        '''
+        if fields not in self._groups:
+            if len(self) == 0:
+                self._groups[fields] = dict()
+            else:
+                grouped = self.keys.groupby(list(fields) if len(fields) > 1 else fields[0], sort=False)
+                self._groups[fields] = {value: positions for value, positions in grouped.indices.items()}
+        return self._groups[fields]
+    
+    def groupby(self, *fields):
+        '''
+        {value: sweep_collection} of the sweeps with each value of fields,
+        from SWEEP_KEY, in order of first appearance.  Values are tuples when
+        more than one field is given.
+        '''
+        if not fields:
+            raise ValueError('groupby needs at least one of the fields '+', '.join(SWEEP_KEY))
+        _check_fields(fields)
+        return {value: self[positions] for value, positions in self._positions(fields).items()}
+    
+    def find(self, **fields):
+        '''
+        The sweeps with exactly the given values of some of the SWEEP_KEY
+        fields, e.g. find(rf_mode=11, t1_time='nom', blf_err='pos'), looked
+        up in constant time once that combination of fields is indexed.
+        '''
+        if not fields:
+            raise ValueError('find needs at least one of the fields '+', '.join(SWEEP_KEY))
+        _check_fields(fields)
+        names = tuple(field for field in SWEEP_KEY if field in fields)
+        value = tuple(fields[field] for field in names) if len(names) > 1 else fields[names[0]]
+        return self[self._positions(names).get(value, np.zeros(0, dtype=int))]
+    
+    def select(self, **fields):
+        '''
+        The sweeps matching all the given SWEEP_KEY fields, each a value or a
+        list of accepted values, in their order in the collection.
+        '''
+        _check_fields(fields)
+        keep = np.ones(len(self), dtype=bool)
+        for field, accepted in fields.items():
+            accepted = list(accepted) if isinstance(accepted, (list, tuple, set, np.ndarray)) else [accepted]
+            keep &= self.keys[field].isin(accepted).to_numpy()
+        return self[keep]
+
+def _check_fields(fields):
+    '''
+    Raises a ValueError naming the fields that are not in SWEEP_KEY.
+    '''
+    unknown = [field for field in fields if field not in SWEEP_KEY]
+    if unknown:
+        raise ValueError('Unknown sweep fields '+', '.join(map(str, unknown))+'; expected some of '+', '.join(SWEEP_KEY))
+
+def as_sweeps(data_obj):
+    '''
+    data_obj as a sweep_collection, data_obj being a sweep_collection, a
+    list of ber_data, or the *data_obj of a function given either.
+    '''
+    if isinstance(data_obj, sweep_collection):
+        return data_obj
+    if len(data_obj) == 1 and isinstance(data_obj[0], sweep_collection):
+        return data_obj[0]
+    return sweep_collection(data_obj)
+    
+class ber_accumulator:
+    '''
+    Running totals of the packet rows of one capture, added a chunk at a time.
+    Bit error, bit and packet counts are summed per attenuation and the RSSI
+    readings are counted into histograms, so BER and PER come out exactly as
+    when all rows are read at once while memory stays bounded.
+    '''
+    def __init__(self):
+        self.totals = dict() #attenuation -> [bit errors, bits, packets with errors, packets]
+        self.rssi_hist = dict() #attenuation -> rssi_histogram
+        self.t1_rssi_hist = dict()
+    
+    def add(self, chunk):
+        '''
+        Adds the packet rows in the DataFrame chunk to the totals, grouping
+        them by attenuation in a single pass.
+        '''
+        codes, atten = pd.factorize(chunk['attenuation']) #attenuation steps in order of appearance
+        keep = codes >= 0 #rows without an attenuation are dropped
+        codes = codes[keep]
+        n_bit_err = chunk['n_bit_err'].to_numpy()[keep]
+        
+        totals = np.stack([np.bincount(codes, weights=n_bit_err, minlength=len(atten)),
+                           np.bincount(codes, weights=chunk['bits/packet'].to_numpy()[keep], minlength=len(atten)),
+                           np.bincount(codes, weights=n_bit_err > 0, minlength=len(atten)),
+                           np.bincount(codes, minlength=len(atten))], axis=1)
+        for each_atten, each_totals in zip(atten, totals):
+            self.totals.setdefault(each_atten, np.zeros(4))[:] += each_totals
+        
+        for name, hist_dict in (('rssi', self.rssi_hist), ('t1_rssi', self.t1_rssi_hist)):
+            if name in chunk.columns: #not parsed with the 'ber' profile
+                for each_atten, (first, counts) in zip(atten, self._count(codes, len(atten), chunk[name].to_numpy()[keep])):
+                    hist_dict.setdefault(each_atten, rssi_histogram()).add_counts(first, counts)
+    
+    @staticmethod
+    def _count(codes, n_groups, readings):
+        '''
+        Counts the RSSI readings of all groups with one bincount over a
+        (group, RSSI value) grid, returning (first, counts) of each group
+        trimmed to the RSSI values it holds.
+        '''
+        if len(readings) == 0:
+            return [(0, [])]*n_groups
+        first = int(readings.min())
+        width = int(readings.max()) - first + 1
+        grid = np.bincount(codes*width + (readings.astype(np.int64) - first), minlength=n_groups*width).reshape(n_groups, width)
+        
+        group_counts = []
+        for row in grid:
+            non_zero = np.flatnonzero(row)
+            group_counts += [(first + non_zero[0], row[non_zero[0]:non_zero[-1]+1]) if len(non_zero) else (0, [])]
+        return group_counts
+    
+    def fill(self, data_obj, budget=DEFAULT_BUDGET):
+        '''
+        Sets the BER, PER and RSSI histograms of data_obj from the totals so
+        far, at the power levels budget, a link_budget, gives the attenuation
+        steps.
+        '''
+        atten = np.array(list(self.totals.keys()), dtype=float)
+        n_bit_err, n_bits, n_err_packets, n_packets = np.array(list(self.totals.values()), dtype=float).reshape(-1, 4).T
+        data_obj.set_curves(budget.sweep_power(data_obj, atten), n_bit_err/n_bits, n_err_packets/n_packets,
+                            rssi=[self.rssi_hist[each] for each in atten] if self.rssi_hist else None,
+                            t1_rssi=[self.t1_rssi_hist[each] for each in atten] if self.t1_rssi_hist else None,
+                            n_bits=n_bits, n_packets=n_packets, atten=atten)
+
 class ber_data_reader:
     '''
     Produces data objects holding information about a BER test.
     '''
-    def __init__(self, folder_name):
+    reads_captures = True #read .bcap files from capture_file.py in place of their CSV files
+    
+    def __init__(self, folder_name, n_workers=1, columns='rssi', cache=True, chunksize=None, budget=DEFAULT_BUDGET):
         '''
         Name of folder where data is stored.  All CSV files within will be read.
+
+        n_workers: int or None
+            Number of worker processes used to parse the CSV files.  1 parses
+            the files one after another in this process, None uses one worker
+            per CPU.  When using more than one worker on Windows, the calling
+            script must be guarded by if __name__ == '__main__'.
+
+        columns: str or list
+            Column profile from COLUMN_PROFILES naming the per-packet columns
+            to parse: 'ber' for BER/PER only, 'rssi' to also keep the RSSI
+            readings, 'full' for every column.  A list of column names may be
+            given instead.  The test settings are always read from the first row.
+
+        cache: bool
+            Keeps the parsed result of each CSV file as a .npz file in the
+            CACHE_FOLDER of folder_name.  A cached result is reused as long as
+            the size and modification time of its CSV file and the column
+            profile are unchanged; otherwise the CSV file is parsed again.
+
+        chunksize: int or None
+            Number of packet rows parsed at a time.  None parses each file at
+            once.  Either way the counts behind BER and PER are summed and the
+            RSSI readings counted into histograms as the rows are parsed, so
+            with chunksize memory stays bounded however long the capture is.
+
+        budget: link_budget
+            Model giving the power level of each attenuation step, by default
+            tx_power_dbm - end_to_end_loss - 2*attenuation rounded to 0.01 dB.
+            Cached files are brought to the budget as they are loaded.
         '''
         
         self.folder_name = folder_name
+        self.n_workers = n_workers
+        self.columns = COLUMN_PROFILES[columns] if isinstance(columns, str) else list(columns)
+        self.cache = cache
+        self.chunksize = chunksize
+        self.budget = budget
+        self.read_errors = dict() #file name -> error message of the files that failed to parse
         
     def read(self):
         '''
         Reads all the CSV files in folder and returns data objects. 
+        A CSV file converted to a .bcap file by capture_file.py is read from
+        that file instead, unless the CSV file is newer.
+        
+        Files are read in order of their names, so the returned list is the same
+        regardless of the number of workers.  A file that fails to parse is
+        reported with a warning and recorded in read_errors, and the remaining
+        files are still read.
         '''
-        files = next(os.walk(self.folder_name))[2]
+        files = self._capture_files()
+        self.read_errors = dict()
+        
+        if self.n_workers == 1:
+            results = [self._read_one(file_name) for file_name in files]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_workers, initializer=init_worker, initargs=(profiler.enabled,)) as pool:
+                results = list(pool.map(self._read_one, files))
+        
         all_data = []
         
-        for file_name in files:
-            if '.csv' in file_name:
-                all_data += [self._read_pandas(file_name)]
+        for file_name, (data_obj, error, records) in zip(files, results):
+            profiler.merge(records)
+            if error is None:
+                all_data += [data_obj]
+            else:
+                self.read_errors[file_name] = error
+                warnings.warn(f'Could not read {file_name}: {error}')
         
         return all_data
+    
+    def _capture_files(self):
+        '''
+        Names of the files to read in folder, in order: the CSV files, each
+        replaced by its .bcap file if that is at least as new.
+        '''
+        names = next(os.walk(self.folder_name))[2]
+        files = [file_name for file_name in names if '.csv' in file_name]
+        if not self.reads_captures:
+            return sorted(files)
         
-    def _read_pandas(self, file_name):
-        '''
-        Read a CSV file in as Pandas.
-        '''
-        dtype_dict = {'test_comment': str,
-                      'rf_mode': float,
-                      'freq_mhz': float,
-                      't1_time': str,
-                      'blf_err': str,
-                      'tx_power': int,
-                      'region': str,
-                      'bits/packet': int,
-                      'packets': int,
-                      'end_to_end_loss': float,
-                      'delayed': bool,
-                      'delayed_reply': bool,
-                      'delimiter_only': bool,
-                      'timestamp': int,
-                      'attenuation': float,
-                      'residue_i': int,
-                      'residue_q': int,
-                      'cdac_i': int,
-                      'cdac_q': int,
-                      'packet_num': int,
-                      'rssi': int,
-                      'rf_phase': int,
-                      'n_bit_err': int,
-                      'rx_bits': str,
-                      'tx_bits': str,
-                      'xor_bits': str,
-                      'dft_peak': bool,
-                      'dft_preamble_detected': bool,
-                      'agc_y_expo': int,
-                      'agc_y_mant': int,
-                      'dft_peak_bin': int,
-                      'pmf_eop_idx': int,
-                      'slot_num': int,
-                      'bd_pm_max': int,
-                      'bd_pm_min': int,
-                      't1_rssi': int,
-                      'pmf_eop_val': int,
-                      'dft_peak_mag': int,
-                      'dft_preamble_detect_idx': int,
-                      'tx_start': int,
-                      'rx_stop': int}
+        captures = {file_name for file_name in names if file_name.endswith(CAPTURE_EXTENSION)}
+        for n, file_name in enumerate(files):
+            capture_name = os.path.splitext(file_name)[0] + CAPTURE_EXTENSION
+            if capture_name in captures:
+                captures.remove(capture_name)
+                if os.path.getmtime(self.folder_name+"/"+ capture_name) >= os.path.getmtime(self.folder_name+"/"+ file_name):
+                    files[n] = capture_name
+        return sorted(files + list(captures)) #also .bcap files whose CSV file was removed
+    
+    def read_sweeps(self):
+        '''
+        Reads all the CSV files in folder as read does, returning them as a
+        sweep_collection.
+        '''
+        return sweep_collection(self.read())
+    
+    def _read_one(self, file_name):
+        '''
+        Reads one CSV file, returning (data_obj, None) on success or
+        (None, error message) on failure so one bad file does not stop the
+        others.  Runs in the worker processes when n_workers is not 1, so the
+        stage timings recorded meanwhile are returned as well.
+        '''
+        try:
+            data_obj = self._load_cache(file_name) if self.cache else None
+            if data_obj is None:
+                data_obj = self._read_pandas(file_name)
+                if self.cache:
+                    self._save_cache(file_name, data_obj)
+            return data_obj, None, profiler.drain()
+        except Exception as err:
+            return None, f'{type(err).__name__}: {err}', profiler.drain()
+    
+    def _cache_path(self, file_name):
+        return os.path.join(self.folder_name, CACHE_FOLDER, file_name+'.npz')
+    
+    def _cache_key(self, file_name):
+        '''
+        Identifies the state of a CSV file and the way it was parsed.  A cached
+        result is only valid while this key is unchanged.
+        '''
+        stat = os.stat(self.folder_name+"/"+ file_name)
+        columns = '*' if self.columns is None else ','.join(self.columns)
+        return f'{CACHE_VERSION}|{stat.st_size}|{stat.st_mtime_ns}|{columns}'
+    
+    def _save_cache(self, file_name, data_obj):
+        '''
+        Writes the BER, PER and RSSI arrays of data_obj to its cache file.
+        A cache that cannot be written,
+        e.g. on a read-only share, only produces a warning.
+        '''
+        cache_path = self._cache_path(file_name)
+        
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with profiler.stage('write cache', file_name), open(cache_path+'.tmp', 'wb') as cache_file:
+                np.savez(cache_file,
+                         key=np.array(self._cache_key(file_name)),
+                         rf_mode=np.array(data_obj.rf_mode),
+                         t1_time=np.array(data_obj.t1_time),
+                         freq_mhz=np.array(data_obj.freq_mhz),
+                         blf_err=np.array(data_obj.blf_err),
+                         tx_power_dbm=np.array(data_obj.tx_power_dbm),
+                         region=np.array(data_obj.region),
+                         end_to_end_loss=np.array(data_obj.end_to_end_loss),
+                         rx_pow=data_obj.rx_pow,
+                         atten=data_obj.atten,
+                         ber=data_obj.ber_curve,
+                         per=data_obj.per_curve,
+                         n_bits=data_obj.n_bits,
+                         n_packets=data_obj.n_packets,
+                         **self._hist_arrays(data_obj.rssi_hists, 'rssi'),
+                         **self._hist_arrays(data_obj.t1_rssi_hists, 't1_rssi'))
+            os.replace(cache_path+'.tmp', cache_path) #only a complete file ever becomes the cache
+        except OSError as err:
+            warnings.warn(f'Could not write cache for {file_name}: {err}')
+    
+    @staticmethod
+    def _hist_arrays(hists, name):
+        '''
+        Arrays of a histogram_set for the cache file.
+        '''
+        return {name+'_first': hists.first, name+'_counts': hists.counts, name+'_offsets': hists.offsets}
+    
+    def _load_cache(self, file_name):
+        '''
+        Returns the data object of file_name from its cache file, or None if
+        there is no valid cache for the current state of the CSV file.
+        '''
+        cache_path = self._cache_path(file_name)
+        
+        if not os.path.isfile(cache_path):
+            return None
         
+        try:
+            with profiler.stage('read cache', file_name, n_bytes=os.path.getsize(cache_path)), np.load(cache_path) as cached:
+                if str(cached['key']) != self._cache_key(file_name):
+                    return None
+                
+                data_obj = ber_data(file_name)
+                data_obj.rf_mode = int(cached['rf_mode'])
+                data_obj.t1_time = str(cached['t1_time'])
+                data_obj.freq_mhz = cached['freq_mhz'][()]
+                data_obj.blf_err = str(cached['blf_err'])
+                data_obj.tx_power_dbm = cached['tx_power_dbm'][()]
+                data_obj.region = str(cached['region'])
+                data_obj.end_to_end_loss = cached['end_to_end_loss'][()]
+                
+                data_obj.rx_pow = cached['rx_pow']
+                data_obj.atten = cached['atten']
+                data_obj.ber_curve = cached['ber']
+                data_obj.per_curve = cached['per']
+                data_obj.n_bits = cached['n_bits']
+                data_obj.n_packets = cached['n_packets']
+                data_obj.rssi_hists = histogram_set(cached['rssi_first'], cached['rssi_counts'], cached['rssi_offsets'])
+                data_obj.t1_rssi_hists = histogram_set(cached['t1_rssi_first'], cached['t1_rssi_counts'], cached['t1_rssi_offsets'])
+        except (OSError, ValueError, KeyError):
+            return None #unreadable or from an older layout, parse the CSV file again
+        
+        self.budget.apply(data_obj) #the cache may have been written under another budget
+        return data_obj
+        
+    def _read_pandas(self, file_name, raw=None):
+        '''
+        Read a CSV file in as Pandas, parsing only the columns of the reader's
+        column profile.
+        
+        raw: bytes or None
+            Contents of the file when already read by the caller,
+            which are parsed instead of opening the file again.
+        '''
         data_obj = ber_data(file_name)
-        data_pd = pd.read_csv(self.folder_name+"/"+ file_name, header=0, dtype=dtype_dict) #read CSV into Pandas DF, with first row as field names
-        data_obj.rf_mode = int(data_pd['rf_mode'].iloc[0])
-        data_obj.t1_time = data_pd['t1_time'].iloc[0]
-        data_obj.freq_mhz = data_pd['freq_mhz'].iloc[0]
-        data_obj.tx_power_dbm = data_pd['tx_power_dbm'].iloc[0]
-        data_obj.region = data_pd['region'].iloc[0]
-        data_obj.end_to_end_loss = data_pd['end_to_end_loss'].iloc[0]
-        data_obj.blf_err = data_pd['blf_err'].iloc[0]
+        self._read_header(data_obj, file_name, raw)
         
-        for atten in data_pd['attenuation'].unique():
-            rx_pow = data_obj.tx_power_dbm - data_obj.end_to_end_loss - atten*2. #atten is applied twice in a roundtrip
-            filter_ = data_pd['attenuation']==atten
-            data_obj.ber[rx_pow] = data_pd[filter_]['n_bit_err'].sum()/data_pd[filter_]['bits/packet'].sum()
-            data_obj.per[rx_pow] = len(data_pd[filter_].query('n_bit_err>0'))/len(data_pd[filter_])
-            data_obj.rssi[rx_pow] = data_pd[filter_]['rssi']
-            data_obj.t1_rssi[rx_pow] = data_pd[filter_]['t1_rssi']
+        if self.chunksize or file_name.endswith(CAPTURE_EXTENSION): #a capture is sliced, not parsed
+            self._aggregate_chunks(data_obj, file_name, raw)
+        else:
+            with profiler.stage('parse CSV', file_name, n_bytes=self._size(file_name, raw)) as stage:
+                data_pd = pd.read_csv(self._source(file_name, raw), header=0, dtype=CSV_DTYPES, usecols=self.columns) #read CSV into Pandas DF, with first row as field names
+                stage.count(rows=len(data_pd))
+            with profiler.stage('aggregate', file_name, rows=len(data_pd)):
+                self._aggregate(data_obj, data_pd)
         return data_obj
-
-def visualize_ber_curves(*data):
     
-    all_data_dict = dict()
+    def _source(self, file_name, raw=None):
+        '''
+        What pd.read_csv reads file_name from: its path, or its contents raw
+        if already read.  A capture file is mapped in place instead.
+        '''
+        if file_name.endswith(CAPTURE_EXTENSION):
+            return capture_file(self.folder_name+"/"+ file_name if raw is None else None, raw)
+        return self.folder_name+"/"+ file_name if raw is None else io.BytesIO(raw)
     
-    for each_data in data:
-        all_data_dict.setdefault(each_data.rf_mode, [])
-        all_data_dict[each_data.rf_mode]+=[each_data]
+    def _read_header(self, data_obj, file_name, raw=None):
+        '''
+        Sets the test settings of data_obj from the first row of file_name.
+        A capture file keeps the name of the CSV file it was converted from.
+        '''
+        source = self._source(file_name, raw)
+        if isinstance(source, capture_file):
+            data_obj.fill_header(source.header_frame())
+            data_obj.name_of_file = source.source or os.path.splitext(file_name)[0]+'.csv'
+        else:
+            data_obj.fill_header(pd.read_csv(source, header=0, dtype=CSV_DTYPES, usecols=HEADER_COLUMNS, nrows=1))
     
-    for each_data_dict in all_data_dict.values():
-        _visualize_ber_curves_plotter(*each_data_dict)
+    def _size(self, file_name, raw=None):
+        return os.path.getsize(self.folder_name+"/"+ file_name) if raw is None else len(raw)
+    
+    def _read_chunks(self, file_name, raw=None, usecols=None):
+        '''
+        Yields the packet rows of file_name chunksize rows at a time, parsing
+        the columns usecols, the column profile by default.  The rows of a
+        capture file are slices of its mapped columns, all at once if
+        chunksize is None.
+        '''
+        usecols = self.columns if usecols is None else usecols
+        source = self._source(file_name, raw)
+        if isinstance(source, capture_file):
+            step = self.chunksize or max(source.n_rows, 1)
+            for start in range(0, source.n_rows, step):
+                with profiler.stage('read capture', file_name, rows=min(step, source.n_rows - start)):
+                    chunk = source.frame(start, start + step, usecols)
+                yield chunk
+            return
+        
+        chunks = iter(pd.read_csv(source, header=0, dtype=CSV_DTYPES, usecols=usecols, chunksize=self.chunksize))
+        first, n_bytes = True, self._size(file_name, raw) #bytes counted with the first chunk
+        while True:
+            with profiler.stage('parse CSV', file_name, n_bytes=n_bytes) as stage:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    stage.count(rows=len(chunk))
+                elif not first:
+                    stage.discard() #only found the end of the file
+            if chunk is None:
+                return
+            first, n_bytes = False, 0
+            yield chunk
+    
+    def _aggregate_chunks(self, data_obj, file_name, raw=None):
+        '''
+        Fills the BER, PER and RSSI histograms of data_obj by
+        reading file_name chunksize rows at a time.
+        '''
+        totals = ber_accumulator()
+        for chunk in self._read_chunks(file_name, raw):
+            with profiler.stage('aggregate', file_name, rows=len(chunk)):
+                totals.add(chunk)
+        totals.fill(data_obj, self.budget)
+    
+    def _aggregate(self, data_obj, data_pd):
+        '''
+        Fills the BER, PER and RSSI histograms of data_obj from the packet
+        rows in data_pd, grouping all rows by attenuation in a single pass.
+        The RSSI histograms are left empty if those columns were not parsed.
+        '''
+        totals = ber_accumulator()
+        totals.add(data_pd)
+        totals.fill(data_obj, self.budget)
+
+def visualize_ber_curves(*data):
+    from matplotlib import pyplot as plt #only loaded when plotting
+    
+    for mode_data in as_sweeps(data).groupby('rf_mode').values():
+        _visualize_ber_curves_plotter(*mode_data)
         plt.show()
 def _visualize_ber_curves_plotter(*data_obj):
-    plt.figure(f'RF mode: {data_obj[0].rf_mode}')
+    from matplotlib import pyplot as plt #only loaded when plotting
+    fig = plt.figure(f'RF mode: {data_obj[0].rf_mode}')
     plt.title(f'RF mode: {data_obj[0].rf_mode}')
     plt.grid(True, which='both', axis='both')
     legend = []
     
     for each_data in data_obj:
-        rx_pow = each_data.ber.keys()
-        ber = [each_data.ber[k] for k in rx_pow]
-        plt.semilogy(rx_pow, ber)
+        plt.semilogy(each_data.rx_pow, each_data.ber_curve)
         legend += ['t1: '+each_data.t1_time+' '+'LF err: '+each_data.blf_err]
 
     plt.legend(legend, fontsize='xx-large')
@@ -150,6 +830,7 @@ def _visualize_ber_curves_plotter(*data_obj):
     plt.ylabel('BER (dB)',fontsize='xx-large')
     plt.xticks(fontsize='xx-large')
     plt.yticks(fontsize='xx-large')
+    return fig
 
 def visualize_rssi_one(*data_obj, rf_mode, t1_time, blf_err):
     '''
@@ -165,63 +846,149 @@ def visualize_rssi_one(*data_obj, rf_mode, t1_time, blf_err):
         'neg', 'nom or 'pos''
     '''
     
-    all_data_dict = dict()
-    
-    for each_data in data_obj:
-        all_data_dict.setdefault(each_data.rf_mode, [])
-        all_data_dict[each_data.rf_mode]+=[each_data]
-    
-    for each_data in all_data_dict[rf_mode]:
-        if each_data.blf_err == blf_err and each_data.t1_time == t1_time:
-            visualize_rssi(each_data)
+    for each_data in as_sweeps(data_obj).find(rf_mode=rf_mode, t1_time=t1_time, blf_err=blf_err):
+        visualize_rssi(each_data)
 
 def visualize_rssi(*data_obj):
     '''
     Produces the RSSI histograms of data_obj.  Each data_obj in *data_obj
-    is used to produce one set of histogram.  
+    is used to produce one set of histogram, drawn from the histograms kept
+    by the reader rather than from the raw readings.
     
     data_obj: ber_data
     '''
-    for each_data in data_obj:
-        rx_pow = each_data.rssi.keys()
-        
-        max_rows = 3 # not more than 5 plots per column
-        max_cols = 5
-        n_cols = int(np.ceil(len(rx_pow)/max_rows))
-        #n_rows = len(rx_pow) if len(rx_pow) < max_rows else max_rows
-        if len(rx_pow) < max_rows:
-            n_rows = len(rx_pow)
-        else:
-            n_rows = len(rx_pow) if len(rx_pow) < max_rows else max_rows
+    from matplotlib import pyplot as plt #only loaded when plotting
+    for each_data in as_sweeps(data_obj):
+        _visualize_rssi_plotter(each_data)
+        plt.show()
+
+def _visualize_rssi_plotter(each_data):
+    '''
+    Draws the RSSI histogram grid of one data object and returns its figure.
+    '''
+    from matplotlib import pyplot as plt #only loaded when plotting
+    rx_pow = each_data.rssi.keys()
+    
+    max_rows = 3 # not more than 5 plots per column
+    max_cols = 5
+    n_cols = int(np.ceil(len(rx_pow)/max_rows))
+    #n_rows = len(rx_pow) if len(rx_pow) < max_rows else max_rows
+    if len(rx_pow) < max_rows:
+        n_rows = len(rx_pow)
+    else:
+        n_rows = len(rx_pow) if len(rx_pow) < max_rows else max_rows
 
-        if n_cols > max_cols:
-            n_cols = max_cols
+    if n_cols > max_cols:
+        n_cols = max_cols
 
-        fig, *ax = plt.subplots(n_rows, n_cols)
-        fig.canvas.manager.set_window_title(f'Mode {each_data.rf_mode} T1: {each_data.t1_time}, LF : {each_data.blf_err}') 
-        fig.tight_layout()
-        #fig.subtitle(f'Mode {each_data.rf_mode} T1: {each_data.t1_time}, LF : {each_data.blf_err}', fontsize=16)
-        
-        if len(ax[0]) > 1:
-            ax = ax[0].flatten('F')
-        
-        for this_ax in ax[len(rx_pow):]:
-            this_ax.remove()
-            
-        for n, each_pow in enumerate(sorted(rx_pow)[:n_cols*n_rows]):
-            ax[n].grid(True, which='both', axis='both')
-            ax[n].hist(each_data.rssi[each_pow], alpha=.7,color='blue') #post-T1 RSSI (RSSI0)
-            ax[n].hist(each_data.t1_rssi[each_pow], alpha=.7,color='red') #pre-T1 RSSI (RSSI1)
-            ax[n].set_xlabel('RSSI value', fontsize='xx-large')
-            ax[n].set_ylabel('count', fontsize='xx-large')
-            ax[n].tick_params(axis='both', which='both', labelsize=15)
-            ax[n].set_title(f'{each_pow} dB input power', fontsize='xx-large')
-            ax[n].legend(['post-T1 rssi', 'pre-T1 rssi'], fontsize='xx-large')
-            ax[n].minorticks_on()
-            if n > 25: # limit the maximum number of plots to 25 or else will crowd out the canvas
-                break
+    fig, *ax = plt.subplots(n_rows, n_cols)
+    fig.canvas.manager.set_window_title(f'Mode {each_data.rf_mode} T1: {each_data.t1_time}, LF : {each_data.blf_err}') 
+    fig.tight_layout()
+    #fig.subtitle(f'Mode {each_data.rf_mode} T1: {each_data.t1_time}, LF : {each_data.blf_err}', fontsize=16)
+    
+    if len(ax[0]) > 1:
+        ax = ax[0].flatten('F')
+    
+    for this_ax in ax[len(rx_pow):]:
+        this_ax.remove()
         
-        plt.show()
+    for n, each_pow in enumerate(sorted(rx_pow)[:n_cols*n_rows]):
+        ax[n].grid(True, which='both', axis='both')
+        rssi, t1_rssi = each_data.rssi[each_pow], each_data.t1_rssi[each_pow]
+        ax[n].hist(rssi.bins, weights=rssi.counts, alpha=.7,color='blue') #post-T1 RSSI (RSSI0), binned from the stored counts
+        ax[n].hist(t1_rssi.bins, weights=t1_rssi.counts, alpha=.7,color='red') #pre-T1 RSSI (RSSI1)
+        ax[n].set_xlabel('RSSI value', fontsize='xx-large')
+        ax[n].set_ylabel('count', fontsize='xx-large')
+        ax[n].tick_params(axis='both', which='both', labelsize=15)
+        ax[n].set_title(f'{each_pow} dB input power', fontsize='xx-large')
+        ax[n].legend(['post-T1 rssi', 'pre-T1 rssi'], fontsize='xx-large')
+        ax[n].minorticks_on()
+        if n > 25: # limit the maximum number of plots to 25 or else will crowd out the canvas
+            break
+    return fig
+
+def _level_groups(data_obj, by):
+    '''
+    Groups the power levels of all data_obj by the columns by, from
+    name_of_file, rf_mode, T1, BLF, freq_mhz and rx_pow.
+
+    return
+    ------
+
+    (codes, keys, sweep, level): the group of each power level, a MultiIndex
+    of the groups, and the index in data_obj and in rx_pow of each power
+    level, power levels being in the order of data_obj and ascending power
+    '''
+    n_pow = [len(each_data.rx_pow) for each_data in data_obj]
+    sweep = np.repeat(np.arange(len(data_obj)), n_pow)
+    level = np.arange(len(sweep)) - np.repeat(np.cumsum(n_pow) - n_pow, n_pow) #index of each power level within its sweep
+
+    rows = pd.DataFrame({'name_of_file': np.array([each_data.name_of_file for each_data in data_obj], dtype=object)[sweep],
+                         'rf_mode': np.array([each_data.rf_mode for each_data in data_obj], dtype=int)[sweep],
+                         'T1': np.array([each_data.t1_time for each_data in data_obj], dtype=object)[sweep],
+                         'BLF': np.array([each_data.blf_err for each_data in data_obj], dtype=object)[sweep],
+                         'freq_mhz': np.array([each_data.freq_mhz for each_data in data_obj], dtype=float)[sweep],
+                         'rx_pow': np.concatenate([each_data.rx_pow for each_data in data_obj] + [np.zeros(0)])})
+    codes, keys = pd.MultiIndex.from_frame(rows[list(by)]).factorize()
+    return codes, keys.set_names(list(by)), sweep, level #factorize drops the names in some pandas versions
+
+@timed('RSSI check')
+def rssi_check_table(*data_obj, tolerance=50.):
+    '''
+    Checks all the data_obj for RSSI anomalies at once and returns the
+    results as a table, without printing.
+
+    For every sweep a line is fitted to the pre-T1 RSSI means against the
+    index of the power level, for all sweeps together in one stacked least
+    squares pass.  The metrics are as described in _check_rssi_one.
+
+    tolerance: float
+        delta_n and delta beyond which the check fails
+
+    return
+    ------
+
+    DataFrame with one row per sweep and power level, in the order of
+    data_obj and ascending power, with columns
+    sweep, name_of_file, rf_mode, T1, BLF, rx_pow, pre_t1_rssi, post_t1_rssi,
+    delta_n, pre_post_delta, delta (of the sweep), and the pass/fail columns
+    delta_n_pass, pre_post_pass, delta_pass
+    '''
+    data_obj = as_sweeps(data_obj)
+    pre_t1_rssi_mean = [each_data.rssi_means(pre_t1=True) for each_data in data_obj]
+    post_t1_rssi_mean = [each_data.rssi_means() for each_data in data_obj]
+    n_pow = np.array([len(each_mean) for each_mean in pre_t1_rssi_mean], dtype=int)
+    sweep = np.repeat(np.arange(len(data_obj)), n_pow)
+    
+    y = np.concatenate(pre_t1_rssi_mean + [np.zeros(0)])
+    n = np.arange(len(sweep)) - np.repeat(np.cumsum(n_pow) - n_pow, n_pow) #index of each power level within its sweep
+    
+    with np.errstate(divide='ignore', invalid='ignore'): #a sweep with a single power level has no line
+        n_mean = (n_pow - 1)/2.
+        y_mean = np.bincount(sweep, weights=y, minlength=len(data_obj))/n_pow
+        m = np.bincount(sweep, weights=(n - n_mean[sweep])*(y - y_mean[sweep]), minlength=len(data_obj)) / \
+            np.bincount(sweep, weights=(n - n_mean[sweep])**2, minlength=len(data_obj)) #slope of the fitted line of each sweep
+    b = y_mean - m*n_mean
+    
+    delta_n = y - (n*m[sweep] + b[sweep]) #each individual versus the fitted line
+    delta = (m*(n_pow - 1))[sweep] # end of fitted line - start of fitted line
+    pre_post_delta = y - np.concatenate(post_t1_rssi_mean + [np.zeros(0)]) #check if the pre-T1 RSSI has ever exceded the post-T1 RSSI
+    
+    table = pd.DataFrame({'sweep': sweep,
+                          'name_of_file': np.array([each_data.name_of_file for each_data in data_obj], dtype=object)[sweep],
+                          'rf_mode': np.array([each_data.rf_mode for each_data in data_obj], dtype=int)[sweep],
+                          'T1': np.array([each_data.t1_time for each_data in data_obj], dtype=object)[sweep],
+                          'BLF': np.array([each_data.blf_err for each_data in data_obj], dtype=object)[sweep],
+                          'rx_pow': np.concatenate([each_data.rx_pow[:len(each_mean)] for each_data, each_mean in zip(data_obj, pre_t1_rssi_mean)] + [np.zeros(0)]),
+                          'pre_t1_rssi': y,
+                          'post_t1_rssi': y - pre_post_delta,
+                          'delta_n': delta_n,
+                          'pre_post_delta': pre_post_delta,
+                          'delta': delta})
+    table['delta_n_pass'] = ~(table['delta_n'].abs() > tolerance)
+    table['pre_post_pass'] = ~(table['pre_post_delta'] > 0)
+    table['delta_pass'] = ~(table['delta'].abs() > tolerance)
+    return table
 
 def _check_rssi_one(data_obj):
     '''
@@ -239,77 +1006,67 @@ def _check_rssi_one(data_obj):
     pre_post_delta is the difference in RSSI values between the pre- and post-T1 RSSI.  The post-T1 RSSI should always 
     be higher as the pre-T1 RSSI is noise only while the post-T1 RSSI is noise + packet signal.
     '''
+    table = rssi_check_table(data_obj)
+    return table['rx_pow'].to_numpy(), table['delta'].iloc[0], table['delta_n'].to_numpy(), table['pre_post_delta'].to_numpy()
 
-    pre_t1_rssi_mean = []
-    post_t1_rssi_mean = []
-    rx_pow = data_obj.rssi.keys()
-    sorted_pow = sorted(rx_pow)
-    pre_t1_rssi_mean = np.array([np.mean(data_obj.t1_rssi[this_pow]) for this_pow in sorted_pow])
-    post_t1_rssi_mean = np.array([np.mean(data_obj.rssi[this_pow]) for this_pow in sorted_pow])
-
-    n = np.arange(len(pre_t1_rssi_mean))
-    m, b = np.polyfit(n, pre_t1_rssi_mean, 1) #fitted line
-    ref_line = n*m+b #y of fitted line
-    delta_n = pre_t1_rssi_mean - ref_line #each individual versus the fitted line
-    delta = m*n[-1] # end of fitted line - start of fitted line
-    pre_post_delta = pre_t1_rssi_mean - post_t1_rssi_mean #check if the pre-T1 RSSI has ever exceded the post-T1 RSSI
-    return sorted_pow, delta, delta_n, pre_post_delta
+def _group_by_mode(table):
+    '''
+    Yields the rows of each RF mode of a table from rssi_check_table, and
+    within it the rows of each sweep, both in order of first appearance.
+    '''
+    for rf_mode, mode_table in table.groupby('rf_mode', sort=False):
+        yield rf_mode, mode_table.groupby('sweep', sort=False)
         
-def check_rssi(*data_obj, t1=['min','nom','max'], blf=['neg','nom','pos'],tolerance = 50.):
+def check_rssi(*data_obj, t1=['min','nom','max'], blf=['neg','nom','pos'],tolerance = 50., table=None):
     '''
     Checks one RF mode for RSSI anomalies.
     
     rf_mode : int
         RF mode
     
-    '''
-    
-    all_data_dict = dict()
+    table : DataFrame
+        Results of rssi_check_table to print instead of checking data_obj
     
-    for each_data in data_obj:
-        all_data_dict.setdefault(each_data.rf_mode, [])
-        all_data_dict[each_data.rf_mode]+=[each_data]
+    '''
+    table = rssi_check_table(as_sweeps(data_obj).select(t1_time=t1, blf_err=blf), tolerance=tolerance) if table is None else table
     
-    for rf_mode in all_data_dict.keys():
+    for rf_mode, sweeps in _group_by_mode(table):
         print('___________________________')
         print(f'RF mode: {rf_mode}')
-        for each_data in all_data_dict[rf_mode]:
-            if each_data.blf_err in blf and each_data.t1_time in t1: #show only the T1 and BLF error settings requested
-                rx_pow, delta, delta_n, pre_post_delta=_check_rssi_one(each_data)
-                print(f'T1: {each_data.t1_time}, BLF: {each_data.blf_err}')
+        for _, sweep_table in sweeps:
+            if sweep_table['BLF'].iloc[0] in blf and sweep_table['T1'].iloc[0] in t1: #show only the T1 and BLF error settings requested
+                print(f'T1: {sweep_table["T1"].iloc[0]}, BLF: {sweep_table["BLF"].iloc[0]}')
                 print('Pow (dBm)'.ljust(12), 'delta_n'.ljust(12), 'pre-post delta'.ljust(12))
-                for each_rx_pow, each_delta_n, each_pre_post in zip(rx_pow, delta_n, pre_post_delta):
-                    delta_n_color = 'red' if abs(each_delta_n) > tolerance else 'green'
-                    pre_post_color = 'red' if each_pre_post > 0 else 'green'
-                    print(f'{each_rx_pow:.2f}'.ljust(12), colored(f'{each_delta_n:.2f}'.ljust(12), delta_n_color), colored(f'{each_pre_post:.2f}'.ljust(12), pre_post_color))
-                delta_color = 'red' if abs(delta) > tolerance else 'green'
-                print('delta:'.ljust(12), colored(f'{delta:.2f}'.ljust(12),delta_color))
+                for row in sweep_table.itertuples():
+                    delta_n_color = 'green' if row.delta_n_pass else 'red'
+                    pre_post_color = 'green' if row.pre_post_pass else 'red'
+                    print(f'{row.rx_pow:.2f}'.ljust(12), colored(f'{row.delta_n:.2f}'.ljust(12), delta_n_color), colored(f'{row.pre_post_delta:.2f}'.ljust(12), pre_post_color))
+                delta_color = 'green' if sweep_table['delta_pass'].iloc[0] else 'red'
+                print('delta:'.ljust(12), colored(f'{sweep_table["delta"].iloc[0]:.2f}'.ljust(12),delta_color))
 
-def check_rssi_brief(*data_obj, tolerance = 50):
+def check_rssi_brief(*data_obj, tolerance = 50, table=None):
     '''
     Checks all the data_obj and briefly shows the results for pass/fail status.
-    '''
-    all_data_dict = dict()
     
-    for each_data in data_obj:
-        all_data_dict.setdefault(each_data.rf_mode, [])
-        all_data_dict[each_data.rf_mode]+=[each_data]
+    table : DataFrame
+        Results of rssi_check_table to print instead of checking data_obj
+    '''
+    table = rssi_check_table(*data_obj, tolerance=tolerance) if table is None else table
     
-    for rf_mode in all_data_dict.keys():
+    for rf_mode, sweeps in _group_by_mode(table):
         print('___________________________')
         print(f'RF mode: {rf_mode}')
-        for each_data in all_data_dict[rf_mode]:
-            rx_pow, delta, delta_n, pre_post_delta=_check_rssi_one(each_data)
-            print(f'T1: {each_data.t1_time}, BLF: {each_data.blf_err}')
+        for _, sweep_table in sweeps:
+            print(f'T1: {sweep_table["T1"].iloc[0]}, BLF: {sweep_table["BLF"].iloc[0]}')
     
-            delta_n_pf = colored('fail'.ljust(12), 'red') if any(abs(delta_n) > tolerance) else colored('pass'.ljust(12), 'green')
+            delta_n_pf = colored('pass'.ljust(12), 'green') if sweep_table['delta_n_pass'].all() else colored('fail'.ljust(12), 'red')
             print('delta_n:'.ljust(12), delta_n_pf)
             
-            delta_pre_post_pf = colored('fail'.ljust(12), 'red') if any(pre_post_delta > 0) else colored('pass'.ljust(12), 'green')
+            delta_pre_post_pf = colored('pass'.ljust(12), 'green') if sweep_table['pre_post_pass'].all() else colored('fail'.ljust(12), 'red')
             print('pre-post:'.ljust(12), delta_pre_post_pf)
             
-            delta_color = 'red' if abs(delta) > tolerance else 'green'
-            print('delta:'.ljust(12), colored(f'{delta:.2f}'.ljust(12),delta_color))
+            delta_color = 'green' if sweep_table['delta_pass'].iloc[0] else 'red'
+            print('delta:'.ljust(12), colored(f'{sweep_table["delta"].iloc[0]:.2f}'.ljust(12),delta_color))
 
 if __name__ == '__main__':
     #plt.close('all')
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Writes synthetic BER captures in the CSV layout read by ber_data_reader,
+for benchmarks and for trying out the analysis without a test rig.
+
+The BER of each attenuation step follows the waterfall of non-coherent
+detection, 0.5*exp(-snr/2), placed so each RF mode, T1 and BLF setting has
+its own sensitivity.  The pre-T1 RSSI is noise only and the post-T1 RSSI is
+signal plus noise, so their difference shrinks with attenuation as modelled
+in rssi_delta.py.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+T1_TICKS = {'min': 200, 'nom': 250, 'max': 300} #tag turnaround from rx_stop to tx_start in clock ticks
+T1_OFFSET_DB = {'min': .3, 'nom': 0., 'max': .3} #sensitivity lost at each T1 setting
+BLF_OFFSET_DB = {'neg': .2, 'nom': 0., 'pos': .2} #sensitivity lost at each BLF error
+
+def _bit_strings(bits):
+    '''
+    Rows of a 0/1 uint8 array as strings of '0' and '1', without a loop
+    over the rows.
+    '''
+    return (bits + ord('0')).astype(np.uint8).view(f'S{bits.shape[1]}').ravel().astype(str)
+
+def write_capture(file_path, rf_mode=11, t1_time='nom', blf_err='nom', sens_dbm=-85., n_atten=20, n_packets=1000,
+                  bits_per_packet=128, atten_start=None, atten_step=.3, freq_mhz=902.75, tx_power_dbm=30, region='fcc',
+                  end_to_end_loss=78.18, noise_rssi=960., signal_rssi=4000., seed=0):
+    '''
+    Writes one capture of n_packets packets at each of n_atten attenuation
+    steps to file_path, one attenuation step at a time so memory does not
+    grow with the size of the capture.
+
+    sens_dbm: float
+        Power in dBm at which the BER of the waterfall is 1e-3
+
+    atten_start, atten_step: float
+        Attenuation of the first step and between steps in dB.  By default
+        the steps are centred on sens_dbm.
+
+    noise_rssi, signal_rssi: float
+        RSSI of the noise, and of the signal with no attenuation
+
+    seed: int
+        Seed of the random draws, for repeatable captures
+    '''
+    rng = np.random.default_rng(seed)
+    snr_at_sens = -2*np.log(2*1.e-3) #snr of the waterfall at BER 1e-3
+    if atten_start is None:
+        atten_start = (tx_power_dbm - end_to_end_loss - sens_dbm)/2. - atten_step*(n_atten-1)/2.
+
+    for step in range(n_atten):
+        atten = round(atten_start + step*atten_step, 2)
+        rx_pow = tx_power_dbm - end_to_end_loss - atten*2. #atten is applied twice in a roundtrip
+        snr = snr_at_sens*10**((rx_pow - sens_dbm)/10)
+
+        n_bit_err = rng.binomial(bits_per_packet, min(.5*np.exp(-snr/2), .5), n_packets)
+        tx_bits = rng.integers(0, 2, (n_packets, bits_per_packet), dtype=np.uint8)
+        xor_bits = (np.argsort(rng.random((n_packets, bits_per_packet)), axis=1) < n_bit_err[:, None]).astype(np.uint8) #n_bit_err random positions per packet
+
+        packet_num = step*n_packets + np.arange(n_packets)
+        timestamp = packet_num*1000 + rng.integers(0, 50, n_packets)
+        rx_stop = timestamp + 400
+        tx_start = rx_stop + T1_TICKS[t1_time] + np.round(rng.normal(0, 2 + 20/snr, n_packets)).astype(int) #turnaround jitters more near sensitivity
+
+        signal = signal_rssi*10**(-atten/20)
+        rssi = np.sqrt(noise_rssi**2 + signal**2) + rng.normal(0, 20, n_packets)
+        t1_rssi = noise_rssi + rng.normal(0, 20, n_packets)
+
+        capture = pd.DataFrame({'test_comment': 'synthetic', 'rf_mode': float(rf_mode), 'freq_mhz': freq_mhz,
+                                't1_time': t1_time, 'blf_err': blf_err, 'tx_power_dbm': tx_power_dbm, 'region': region,
+                                'bits/packet': bits_per_packet, 'packets': n_packets, 'end_to_end_loss': end_to_end_loss,
+                                'delayed': False, 'delayed_reply': False, 'delimiter_only': False, 'timestamp': timestamp,
+                                'attenuation': atten, 'residue_i': 0, 'residue_q': 0, 'cdac_i': 0, 'cdac_q': 0,
+                                'packet_num': packet_num, 'rssi': rssi.astype(int), 'rf_phase': rng.integers(0, 64, n_packets),
+                                'n_bit_err': n_bit_err, 'rx_bits': _bit_strings(tx_bits ^ xor_bits), 'tx_bits': _bit_strings(tx_bits),
+                                'xor_bits': _bit_strings(xor_bits), 'dft_peak': True, 'dft_preamble_detected': True,
+                                'agc_y_expo': 0, 'agc_y_mant': 0, 'dft_peak_bin': 0, 'pmf_eop_idx': rng.integers(100, 200, n_packets),
+                                'slot_num': 0, 'bd_pm_max': 0, 'bd_pm_min': 0, 't1_rssi': t1_rssi.astype(int), 'pmf_eop_val': 0,
+                                'dft_peak_mag': 0, 'dft_preamble_detect_idx': rng.integers(10, 20, n_packets),
+                                'tx_start': tx_start, 'rx_stop': rx_stop})
+        capture.to_csv(file_path, mode='w' if step == 0 else 'a', header=step == 0, index=False)
+
+def write_captures(folder_name, rf_modes=(11, 120, 224), t1=('min', 'nom', 'max'), blf=('neg', 'nom', 'pos'),
+                   sens_offset_db=0., seed=0, **capture_args):
+    '''
+    Writes one capture per RF mode, T1 and BLF setting to folder_name,
+    named mode<rf_mode>_<t1>_<blf>.csv.  Returns the file names.
+
+    sens_offset_db: float
+        Added to the sensitivity of every capture, e.g. to write a branch
+        that is worse than a baseline written with the same seed
+
+    capture_args:
+        Passed on to write_capture, e.g. n_atten, n_packets, bits_per_packet
+    '''
+    os.makedirs(folder_name, exist_ok=True)
+    file_names = []
+
+    for mode_idx, rf_mode in enumerate(rf_modes):
+        for each_t1 in t1:
+            for each_blf in blf:
+                file_name = f'mode{rf_mode}_{each_t1}_{each_blf}.csv'
+                sens_dbm = -85. + 1.5*(mode_idx % 4) + T1_OFFSET_DB[each_t1] + BLF_OFFSET_DB[each_blf] + sens_offset_db
+                write_capture(os.path.join(folder_name, file_name), rf_mode, each_t1, each_blf, sens_dbm,
+                              seed=seed + len(file_names), **capture_args)
+                file_names += [file_name]
+    return file_names
+
+if __name__ == '__main__':
+    write_captures('test_data_synthetic')
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of read_folders on captures written by synthetic_data.
+
+    python -m pytest test_async_read.py
+"""
+import numpy as np
+import pytest
+from async_read import read_folders
+from instrument import profiler
+from summarize_data import ber_data_reader
+from synthetic_data import write_capture
+
+@pytest.fixture
+def folder(tmp_path):
+    for t1_time in ('nom', 'min'):
+        write_capture(str(tmp_path/f'mode11_{t1_time}_nom.csv'), 11, t1_time, 'nom', n_atten=5, n_packets=200,
+                      bits_per_packet=32)
+    return tmp_path
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_files_are_streamed_in_chunks(folder, n_workers):
+    profiler.enable()
+    try:
+        sweeps = read_folders([str(folder)], n_workers=n_workers, cache=False, chunksize=300)[str(folder)]
+        records = {file_name: record for (stage, file_name), record in profiler.records.items() if stage == 'parse CSV'}
+    finally:
+        profiler.disable()
+    assert {file_name: record[0] for file_name, record in records.items()} == {'mode11_nom_nom.csv': 4, 'mode11_min_nom.csv': 4}
+
+    expected = ber_data_reader(str(folder), cache=False).read()
+    for data_obj, each_expected in zip(sweeps, expected):
+        assert data_obj.name_of_file == each_expected.name_of_file
+        np.testing.assert_array_equal(data_obj.ber_curve, each_expected.ber_curve)
+
+def test_parsers_get_paths_not_bytes(folder, monkeypatch):
+    given = []
+    read_pandas = ber_data_reader._read_pandas
+    def record_raw(self, file_name, raw=None):
+        given.append(raw)
+        return read_pandas(self, file_name, raw)
+    monkeypatch.setattr(ber_data_reader, '_read_pandas', record_raw)
+    read_folders([str(folder)], cache=False)
+    assert given == [None, None]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the bit error tables against counts taken packet by packet, on
+captures written by synthetic_data.
+
+    python -m pytest test_bit_errors.py
+"""
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from bit_errors import SEGMENTS, bit_error_reader, position_table, segment_table, flip_table
+from synthetic_data import write_capture
+
+@pytest.fixture(scope='module')
+def mixed_lengths(tmp_path_factory):
+    '''
+    A 128-bit and a 32-bit sweep of the same RF mode, and the reference
+    counts of all their packets by bit position.
+    '''
+    folder = tmp_path_factory.mktemp('mixed')
+    for t1_time, n_bits in (('nom', 128), ('min', 32)):
+        write_capture(str(folder/f'mode11_{t1_time}_nom.csv'), 11, t1_time, 'nom', sens_dbm=-86., n_atten=3, n_packets=200,
+                      bits_per_packet=n_bits, seed=n_bits)
+
+    reference = {name: np.zeros(128) for name in ('errors', 'flips_1to0', 'tx_ones', 'n_sent')}
+    segments = {name: np.zeros(2) for name in SEGMENTS} #errors, bits
+    for file_path in sorted(folder.iterdir()):
+        frame = pd.read_csv(file_path, dtype={'tx_bits': str, 'xor_bits': str})
+        for tx_bits, xor_bits in zip(frame['tx_bits'], frame['xor_bits']):
+            tx = np.array(list(tx_bits), dtype=int)
+            xor = np.array(list(xor_bits), dtype=int)
+            reference['errors'][:len(tx)] += xor
+            reference['flips_1to0'][:len(tx)] += xor & tx
+            reference['tx_ones'][:len(tx)] += tx
+            reference['n_sent'][:len(tx)] += 1
+            for name, (start, stop) in SEGMENTS.items():
+                segments[name] += [xor[start:stop].sum(), len(xor[start:stop])]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        bit_obj = bit_error_reader(str(folder), chunksize=150).read()
+    return bit_obj, reference, segments
+
+def test_position_rates_over_bits_sent(mixed_lengths):
+    bit_obj, reference, _ = mixed_lengths
+    table = position_table(*bit_obj, by=['rf_mode'])
+    np.testing.assert_array_equal(table['n_sent'], reference['n_sent'])
+    np.testing.assert_allclose(table['error_rate'], reference['errors']/reference['n_sent'])
+    np.testing.assert_allclose(table['rate_0to1'], (reference['errors'] - reference['flips_1to0'])/(reference['n_sent'] - reference['tx_ones']))
+
+def test_flip_rates_over_bits_sent(mixed_lengths):
+    bit_obj, reference, _ = mixed_lengths
+    row = flip_table(*bit_obj, by=['rf_mode']).iloc[0]
+    zeros_sent = (reference['n_sent'] - reference['tx_ones']).sum()
+    assert row['rate_0to1'] == pytest.approx((reference['errors'] - reference['flips_1to0']).sum()/zeros_sent)
+    assert row['rate_1to0'] == pytest.approx(reference['flips_1to0'].sum()/reference['tx_ones'].sum())
+
+def test_segments_of_each_packet_length(mixed_lengths):
+    bit_obj, _, segments = mixed_lengths
+    row = segment_table(*bit_obj, by=['rf_mode']).iloc[0]
+    for name, (errors, n_bits) in segments.items():
+        assert row[name+'_rate'] == pytest.approx(errors/n_bits)
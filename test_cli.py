@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the command-line entry point on captures written by
+synthetic_data.
+
+    python -m pytest test_cli.py
+"""
+import json
+import warnings
+import pytest
+import cli
+import sensitivity_comp
+from synthetic_data import write_captures
+
+@pytest.fixture
+def folders(tmp_path):
+    for name, offset in (('master', 0.), ('mine', 1.)):
+        write_captures(str(tmp_path/name), rf_modes=(11,), t1=('nom',), blf=('nom', 'pos'), sens_offset_db=offset,
+                       n_atten=8, n_packets=100, bits_per_packet=64)
+    return tmp_path
+
+@pytest.fixture(autouse=True)
+def no_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+def test_compare_json_with_excel(folders, capsys):
+    cli.main(['compare', str(folders/'master'), str(folders/'mine'), '--names', 'master', 'mine', '--no-cache',
+              '--format', 'json', '--excel', str(folders/'comp')])
+    rows = json.loads(capsys.readouterr().out) #nothing but the JSON on stdout
+    assert {(row['T1'], row['BLF']) for row in rows} == {('nom', 'nom'), ('nom', 'pos')}
+    assert (folders/'comp.xlsx').is_file()
+
+def test_report_passes_metric(folders, monkeypatch):
+    import report
+    metrics = []
+    sensitivities = sensitivity_comp.sensitivities
+    def record_metric(*data_obj, **kwargs):
+        metrics.append(kwargs.get('metric'))
+        return sensitivities(*data_obj, **kwargs)
+    monkeypatch.setattr(sensitivity_comp, 'sensitivities', record_metric)
+    monkeypatch.setattr(report, 'render_report', lambda *args, **kwargs: 'rendered')
+    cli.main(['report', str(folders/'mine'), '--baseline', str(folders/'master'), '--metric', 'per', '--no-cache',
+              '--out', str(folders/'report')])
+    assert metrics == ['per', 'per']
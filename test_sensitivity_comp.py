@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the interpolation engine of sensitivity_comp: the monotonic fit,
+the lookup of the targets and the reasons a target is not reached.
+
+    python -m pytest test_sensitivity_comp.py
+"""
+import warnings
+import numpy as np
+import pytest
+from summarize_data import ber_data
+from sensitivity_comp import (my_log_interp, unreached_targets, sensitivities, _sensitivity_status, _monotone_fit,
+                              _pack_points, REACHED, BELOW_CURVE, ABOVE_CURVE, NO_ERRORS, UNREACHED_REASONS)
+
+POW = np.array([-90., -88., -86., -84.])
+BER = np.array([1.e-2, 1.e-3, 1.e-4, 1.e-5])
+
+def _sweep(ber, rx_pow=POW, t1_blf=('nom', 'nom')):
+    data_obj = ber_data('test.csv')
+    data_obj.t1_time, data_obj.blf_err = t1_blf
+    data_obj.set_curves(rx_pow, ber, ber)
+    return data_obj
+
+def _status(*data_obj, targets=(1.e-3,)):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return _sensitivity_status(list(data_obj), targets)
+
+def _reference_pava(values):
+    '''
+    Isotonic least squares fit, non-decreasing, by pooling adjacent
+    violators one block at a time.
+    '''
+    blocks = [] #[mean, number of points]
+    for value in values:
+        blocks += [[value, 1]]
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            mean, n = blocks.pop()
+            blocks[-1] = [(blocks[-1][0]*blocks[-1][1] + mean*n)/(blocks[-1][1] + n), blocks[-1][1] + n]
+    return np.concatenate([np.full(n, mean) for mean, n in blocks]) if blocks else np.zeros(0)
+
+def test_monotone_fit_matches_reference_pava():
+    rng = np.random.default_rng(0)
+    n_points = rng.integers(0, 12, 500)
+    log_ber = np.full((len(n_points), 12), np.nan)
+    for row, n in enumerate(n_points):
+        log_ber[row, :n] = np.sort(rng.normal(-4, 1.5, n)) + rng.normal(0, 1., n)
+
+    fit = _monotone_fit(log_ber, n_points)
+    for row, n in enumerate(n_points):
+        np.testing.assert_allclose(fit[row, :n], _reference_pava(log_ber[row, :n]), atol=1.e-12)
+        assert np.isnan(fit[row, n:]).all()
+
+def test_monotone_fit_same_in_blocks():
+    rng = np.random.default_rng(1)
+    log_ber = np.sort(rng.normal(-4, 1.5, (50, 20)), axis=1) + rng.normal(0, 1., (50, 20))
+    n_points = np.full(50, 20)
+    np.testing.assert_array_equal(_monotone_fit(log_ber, n_points, block_size=21**2), _monotone_fit(log_ber, n_points))
+
+def test_monotonic_curve_unchanged():
+    log_ber = np.log10(BER[::-1])[None, :]
+    np.testing.assert_allclose(_monotone_fit(log_ber, np.array([4])), log_ber)
+
+def test_log_interpolation():
+    assert my_log_interp(10**-3.5, POW, BER) == pytest.approx(-87.)
+    assert my_log_interp(10**-2.5, POW, BER) == pytest.approx(-89.)
+
+def test_points_need_not_be_sorted():
+    order = [2, 0, 3, 1]
+    assert my_log_interp(10**-3.5, POW[order], BER[order]) == pytest.approx(-87.)
+
+@pytest.mark.parametrize('target, power', [(1.e-2, -90.), (1.e-5, -84.)])
+def test_exact_hit_at_either_end(target, power):
+    assert my_log_interp(target, POW, BER) == pytest.approx(power)
+    sens, status = _status(_sweep(BER), targets=[target])
+    assert sens[0, 0] == pytest.approx(power)
+    assert status[0, 0] == REACHED
+
+def test_not_crossed_gives_nan():
+    assert np.isnan(my_log_interp(1.e-6, POW, BER)) #below the curve, no StopIteration
+    assert np.isnan(my_log_interp(1.e-1, POW, BER)) #above the curve
+
+def test_non_monotonic_curve_is_fitted():
+    data_obj = _sweep([1.e-2, 1.e-4, 1.e-3, 1.e-5]) #-88 and -86 pooled to 10**-3.5
+    with pytest.warns(UserWarning, match='not monotonically decreasing'):
+        sens = sensitivities(data_obj, targets=[1.e-3, 10**-3.5])
+    sens = sens[11]['nom_nom']
+    assert sens[0] == pytest.approx(-90. + 2./1.5)
+    assert sens[1] == pytest.approx(-88.)
+
+def test_error_floor_is_below_curve():
+    sens, status = _status(_sweep([1.e-2, 1.e-3, 5.e-4, 5.e-4]), targets=[1.e-3, 1.e-4])
+    assert sens[0, 0] == pytest.approx(-88.)
+    assert np.isnan(sens[0, 1])
+    assert status[0, 1] == BELOW_CURVE
+
+def test_target_above_curve():
+    sens, status = _status(_sweep(BER), targets=[1.e-1])
+    assert np.isnan(sens[0, 0])
+    assert status[0, 0] == ABOVE_CURVE
+
+def test_all_zero_curve_has_no_errors():
+    sens, status = _status(_sweep(np.zeros(4)), targets=[1.e-3, 1.e-4])
+    assert np.isnan(sens).all()
+    assert (status == NO_ERRORS).all()
+
+def test_zero_points_are_dropped():
+    sens, status = _status(_sweep([1.e-2, 1.e-3, 1.e-4, 0.]), targets=[10**-3.5])
+    assert sens[0, 0] == pytest.approx(-87.)
+
+def test_curves_of_different_lengths_together():
+    short = _sweep([1.e-2, 1.e-4], rx_pow=[-90., -86.])
+    sens, status = _status(_sweep(BER), short, _sweep(np.zeros(4)), targets=[1.e-3, 1.e-5])
+    np.testing.assert_allclose(sens[:2, 0], [-88., -88.])
+    assert sens[0, 1] == pytest.approx(-84.)
+    assert status[1, 1] == BELOW_CURVE
+    assert (status[2] == NO_ERRORS).all()
+
+def test_matches_per_curve_interpolation():
+    rng = np.random.default_rng(2)
+    curves = [np.sort(10**rng.uniform(-6, -1, n))[::-1] for n in rng.integers(2, 15, 200)]
+    data_obj = [_sweep(ber, rx_pow=np.arange(len(ber))*2. - 90.) for ber in curves]
+    targets = 10**rng.uniform(-5, -2, 3)
+    sens, status = _status(*data_obj, targets=targets)
+    for each_data, each_sens in zip(data_obj, sens):
+        log_ber = np.log10(each_data.ber_curve[::-1])
+        expected = np.interp(np.log10(targets), log_ber, each_data.rx_pow[::-1], left=np.nan, right=np.nan)
+        np.testing.assert_allclose(each_sens, expected)
+
+def test_unreached_targets_lists_reasons():
+    table = unreached_targets(_sweep(BER), _sweep(np.zeros(4), t1_blf=('min', 'neg')), targets=[1.e-1, 1.e-3, 1.e-6])
+    assert list(table['reason']) == [UNREACHED_REASONS[ABOVE_CURVE], UNREACHED_REASONS[BELOW_CURVE]] + [UNREACHED_REASONS[NO_ERRORS]]*3
+    assert list(table['T1']) == ['nom', 'nom', 'min', 'min', 'min']
+
+def test_pack_points_drops_zeros():
+    log_ber, pow_dbm, n_points = _pack_points(np.array([0, 0, 1]), np.array([-84., -86., -84.]), np.array([1.e-4, 0., 0.]), 2)
+    np.testing.assert_array_equal(n_points, [1, 0])
+    assert log_ber[0, 0] == pytest.approx(-4.)
+    assert np.isnan(pow_dbm[1]).all()
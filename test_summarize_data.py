@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the data objects of summarize_data, on small captures written by
+synthetic_data.
+
+    python -m pytest test_summarize_data.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from summarize_data import ber_data_reader, sweep_collection
+from synthetic_data import write_capture, write_captures
+
+@pytest.fixture
+def capture_folder(tmp_path):
+    write_capture(str(tmp_path/'mode11_nom_nom.csv'), n_atten=5, n_packets=200, bits_per_packet=32)
+    return tmp_path
+
+@pytest.fixture
+def data_obj(capture_folder):
+    return ber_data_reader(str(capture_folder), cache=False).read()[0]
+
+def test_power_views_are_dicts(data_obj):
+    for view, curve in ((data_obj.ber, data_obj.ber_curve), (data_obj.per, data_obj.per_curve)):
+        assert dict(view) == dict(zip(data_obj.rx_pow, curve))
+        assert list(view.keys()) == list(data_obj.rx_pow)
+        assert list(view.values()) == list(curve)
+        assert list(view.items()) == list(zip(data_obj.rx_pow, curve))
+        assert len(view) == len(data_obj.rx_pow)
+        with pytest.raises(KeyError):
+            view[data_obj.rx_pow[0] - 100.]
+
+def test_rssi_histogram_acts_as_series(capture_folder, data_obj):
+    frame = pd.read_csv(capture_folder/'mode11_nom_nom.csv')
+    for atten, rx_pow in zip(data_obj.atten, data_obj.rx_pow):
+        readings = frame.loc[frame['attenuation'] == atten, 'rssi']
+        hist = data_obj.rssi[rx_pow]
+        assert sorted(readings) == list(hist) == list(hist.values)
+        assert len(hist) == len(readings)
+        for func in (np.mean, np.var, np.std):
+            assert func(hist) == pytest.approx(func(readings))
+        assert hist.var() == pytest.approx(readings.var())
+        assert hist.std() == pytest.approx(readings.std())
+        assert np.mean(hist.values) == pytest.approx(readings.mean())
+
+def test_chunked_parse_counts_one_call_per_chunk(capture_folder):
+    from instrument import profiler
+    profiler.enable()
+    try:
+        ber_data_reader(str(capture_folder), cache=False, chunksize=300).read()
+        calls, _, rows, n_bytes = profiler.records[('parse CSV', 'mode11_nom_nom.csv')]
+    finally:
+        profiler.disable()
+    assert (calls, rows) == (4, 1000)
+    assert n_bytes == (capture_folder/'mode11_nom_nom.csv').stat().st_size
+
+def test_sweep_lookup_rejects_unknown_fields(data_obj):
+    sweeps = sweep_collection([data_obj])
+    assert list(sweeps.find(rf_mode=11, t1_time='nom')) == [data_obj]
+    with pytest.raises(ValueError, match='t1'):
+        sweeps.find(rf_mode=11, t1='nom')
+    with pytest.raises(ValueError, match='at least one'):
+        sweeps.find()
+    with pytest.raises(ValueError, match='blf'):
+        sweeps.select(blf='nom')
+
+def test_capture_files_keep_csv_names(tmp_path):
+    from capture_file import convert_folder
+    from summarize_data import rssi_check_table
+    write_captures(str(tmp_path), rf_modes=(11,), t1=('nom', 'min'), blf=('nom',), n_atten=5, n_packets=100,
+                   bits_per_packet=32)
+    from_csv = ber_data_reader(str(tmp_path), cache=False).read()
+    convert_folder(str(tmp_path))
+    reader = ber_data_reader(str(tmp_path), cache=False)
+    assert all(file_name.endswith('.bcap') for file_name in reader._capture_files())
+    from_capture = reader.read()
+    assert [data_obj.name_of_file for data_obj in from_capture] == [data_obj.name_of_file for data_obj in from_csv]
+    assert all(data_obj.name_of_file.endswith('.csv') for data_obj in from_capture)
+    for data_obj, each_csv in zip(from_capture, from_csv):
+        np.testing.assert_array_equal(data_obj.ber_curve, each_csv.ber_curve)
+    pd.testing.assert_frame_equal(rssi_check_table(*from_capture), rssi_check_table(*from_csv))
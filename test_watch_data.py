@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of ber_data_watcher on captures written by synthetic_data.
+
+    python -m pytest test_watch_data.py
+"""
+import os
+import warnings
+import pytest
+from watch_data import ber_data_watcher
+from synthetic_data import write_capture
+
+def _write(file_path, rf_mode=11, t1_time='nom', blf_err='nom', n_packets=100):
+    write_capture(str(file_path), rf_mode, t1_time, blf_err, n_atten=4, n_packets=n_packets, bits_per_packet=32)
+
+def _settings(watcher):
+    return {(mode, setting) for mode, mode_dict in watcher.sens_dict.items() if mode != 'targets' for setting in mode_dict}
+
+@pytest.fixture(autouse=True)
+def no_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+def test_appended_rows_are_read(tmp_path):
+    _write(tmp_path/'full.csv')
+    raw = (tmp_path/'full.csv').read_bytes()
+    os.remove(tmp_path/'full.csv')
+    (tmp_path/'a.csv').write_bytes(raw[:len(raw)//3])
+    watcher = ber_data_watcher(str(tmp_path))
+    watcher.update()
+    with open(tmp_path/'a.csv', 'ab') as csv_file:
+        csv_file.write(raw[len(raw)//3:])
+    watcher.update()
+    assert watcher.data[0].n_packets.sum() == 400
+
+def test_rewritten_file_replaces_its_results(tmp_path):
+    _write(tmp_path/'a.csv', n_packets=20)
+    watcher = ber_data_watcher(str(tmp_path))
+    watcher.update()
+    assert _settings(watcher) == {(11, 'nom_nom')}
+
+    _write(tmp_path/'a.csv', rf_mode=120, t1_time='min', blf_err='pos') #larger than what was read
+    watcher.update()
+    assert _settings(watcher) == {(120, 'min_pos')}
+    assert watcher.data[0].n_packets.sum() == 400
+    assert not watcher.read_errors
+
+def test_removed_file_is_dropped(tmp_path):
+    _write(tmp_path/'a.csv')
+    _write(tmp_path/'b.csv', t1_time='min')
+    watcher = ber_data_watcher(str(tmp_path))
+    watcher.update()
+    os.remove(tmp_path/'b.csv')
+    watcher.update()
+    assert list(watcher.files) == ['a.csv']
+    assert list(watcher.rssi_checks) == ['a.csv']
+    assert _settings(watcher) == {(11, 'nom_nom')}
+
+def test_bad_file_does_not_stop_others(tmp_path):
+    _write(tmp_path/'a.csv')
+    (tmp_path/'b.csv').write_text('attenuation,n_bit_err\n1,x,y\n')
+    watcher = ber_data_watcher(str(tmp_path))
+    watcher.update()
+    assert list(watcher.read_errors) == ['b.csv']
+    assert len(watcher.data) == 1
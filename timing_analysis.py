@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Per-packet timing of the captures: the T1 turnaround from the end of the
+reader command (rx_stop) to the start of the tag reply (tx_start), and the
+other timing columns logged with every packet.
+
+The captures are read a chunk of rows at a time.  Each timing quantity is an
+integer number of clock ticks or sample indices, so it is counted into a
+histogram per attenuation step as in the RSSI histograms of summarize_data,
+and percentiles come out exactly without holding the packets in memory.
+Sums of the quantity, n_bit_err and their products are kept alongside for the
+correlation between timing and bit errors.  Values outside TIMING_RANGES,
+e.g. a tx_start of 0 or -1 logged for a packet with no reply, only count as
+underflow or overflow, so the histograms stay bounded.
+
+    from timing_analysis import timing_reader, timing_table
+    timing_obj = timing_reader('test_data').read()
+    timing_table(*timing_obj, quantity='t1', by=['rf_mode', 'T1'])
+"""
+import numpy as np
+import pandas as pd
+from summarize_data import COLUMN_PROFILES, ber_data, ber_data_reader, ber_accumulator, rssi_histogram, histogram_set, as_sweeps, _level_groups
+from instrument import profiler
+from link_budget import DEFAULT_BUDGET
+
+# timing quantity -> (column, column subtracted from it or None)
+TIMING_QUANTITIES = {'t1': ('tx_start', 'rx_stop'),
+                     'rx_time': ('rx_stop', 'timestamp'),
+                     'eop_idx': ('pmf_eop_idx', None),
+                     'preamble_idx': ('dft_preamble_detect_idx', None)}
+
+# timing quantity -> [lowest, highest) value counted in its histograms, in ticks or samples
+TIMING_RANGES = {name: (0, 2**16) for name in TIMING_QUANTITIES}
+
+# per-packet columns parsed by timing_reader
+TIMING_COLUMNS = COLUMN_PROFILES['ber'] + ['timestamp', 'tx_start', 'rx_stop', 'pmf_eop_idx', 'dft_preamble_detect_idx']
+
+# sums kept per attenuation step and quantity x, with y the n_bit_err of the packet
+MOMENTS = ['n', 'x', 'xx', 'y', 'yy', 'xy']
+
+class timing_accumulator:
+    '''
+    Running histograms and sums of the timing quantities of one capture per
+    attenuation step, added a chunk of rows at a time.
+    '''
+    def __init__(self, ranges=None):
+        '''
+        ranges: dict
+            [lowest, highest) value of some of the TIMING_QUANTITIES, in place
+            of those in TIMING_RANGES.  Values outside are counted in outside
+            and left out of the histograms and sums.
+        '''
+        self.ranges = [{**TIMING_RANGES, **(ranges or {})}[name] for name in TIMING_QUANTITIES]
+        self.hists = dict() #attenuation -> list of rssi_histogram, one per quantity
+        self.moments = dict() #attenuation -> array of MOMENTS, one row per quantity
+        self.outside = dict() #attenuation -> number of values under and over the range, one row per quantity
+
+    def add(self, chunk):
+        '''
+        Adds the packet rows in the DataFrame chunk, grouping them by
+        attenuation in a single pass.  Quantities whose columns are not in
+        chunk, e.g. in older captures, are left empty.
+        '''
+        codes, atten = pd.factorize(chunk['attenuation'])
+        keep = codes >= 0
+        codes = codes[keep]
+        y = chunk['n_bit_err'].to_numpy(dtype=float)[keep]
+
+        for each_atten in atten:
+            self.hists.setdefault(each_atten, [rssi_histogram() for _ in TIMING_QUANTITIES])
+            self.moments.setdefault(each_atten, np.zeros((len(TIMING_QUANTITIES), len(MOMENTS))))
+            self.outside.setdefault(each_atten, np.zeros((len(TIMING_QUANTITIES), 2), dtype=np.int64))
+
+        for q, (column, minus) in enumerate(TIMING_QUANTITIES.values()):
+            if column not in chunk.columns or (minus is not None and minus not in chunk.columns):
+                continue
+            x = chunk[column].to_numpy(dtype=np.int64)[keep]
+            if minus is not None:
+                x = x - chunk[minus].to_numpy(dtype=np.int64)[keep]
+
+            low, high = self.ranges[q]
+            under, over = x < low, x >= high
+            outside = np.stack([np.bincount(codes, weights=under, minlength=len(atten)),
+                                np.bincount(codes, weights=over, minlength=len(atten))], axis=1).astype(np.int64)
+            for each_atten, each_outside in zip(atten, outside):
+                self.outside[each_atten][q] += each_outside
+            inside = ~(under | over)
+            q_codes, x, q_y = codes[inside], x[inside], y[inside]
+
+            for each_atten, (first, counts) in zip(atten, ber_accumulator._count(q_codes, len(atten), x)):
+                self.hists[each_atten][q].add_counts(first, counts)
+
+            x = x.astype(float)
+            sums = np.stack([np.bincount(q_codes, weights=weights, minlength=len(atten))
+                             for weights in (np.ones_like(x), x, x*x, q_y, q_y*q_y, x*q_y)], axis=1)
+            for each_atten, each_sums in zip(atten, sums):
+                self.moments[each_atten][q] += each_sums
+
+    def fill(self, data_obj):
+        '''
+        Sets the timing histograms and sums of data_obj, whose rx_pow has
+        already been set from the same rows, in the order of its attenuation
+        steps.
+        '''
+        atten = data_obj.atten
+        data_obj.timing_hists = {name: histogram_set.from_histograms([self.hists[each][q] for each in atten])
+                                 for q, name in enumerate(TIMING_QUANTITIES)}
+        data_obj.timing_moments = np.array([self.moments[each] for each in atten]).reshape(len(atten), len(TIMING_QUANTITIES), len(MOMENTS))
+        data_obj.timing_outside = np.array([self.outside[each] for each in atten], dtype=np.int64).reshape(len(atten), len(TIMING_QUANTITIES), 2)
+
+class timing_data(ber_data):
+    '''
+    ber_data with, for each power level in rx_pow, a histogram of each of the
+    TIMING_QUANTITIES in timing_hists and the MOMENTS of each quantity with
+    n_bit_err in timing_moments (power level, quantity, moment).  The values
+    under and over TIMING_RANGES, left out of both, are counted in
+    timing_outside (power level, quantity, under/over).
+    '''
+    __slots__ = ('timing_hists', 'timing_moments', 'timing_outside')
+
+    def __init__(self, name_of_data):
+        super().__init__(name_of_data)
+        self.timing_hists = {name: histogram_set() for name in TIMING_QUANTITIES}
+        self.timing_moments = np.zeros((0, len(TIMING_QUANTITIES), len(MOMENTS)))
+        self.timing_outside = np.zeros((0, len(TIMING_QUANTITIES), 2), dtype=np.int64)
+
+class timing_reader(ber_data_reader):
+    '''
+    Reads the BER curves and timing of all captures in a folder, always a
+    chunk of rows at a time.  The timing is not kept in the cache of
+    ber_data_reader, so the CSV files are parsed on every read.
+    '''
+    def __init__(self, folder_name, n_workers=1, chunksize=2**18, budget=DEFAULT_BUDGET, ranges=None):
+        '''
+        n_workers, budget:
+            As in ber_data_reader
+
+        chunksize: int
+            Number of packet rows parsed at a time, which bounds memory
+
+        ranges: dict
+            As in timing_accumulator
+        '''
+        super().__init__(folder_name, n_workers=n_workers, columns=TIMING_COLUMNS, cache=False, chunksize=chunksize, budget=budget)
+        self.ranges = ranges
+
+    def _read_pandas(self, file_name, raw=None):
+        data_obj = timing_data(file_name)
+        self._read_header(data_obj, file_name, raw)
+
+        totals = ber_accumulator()
+        timing = timing_accumulator(self.ranges)
+        for chunk in self._read_chunks(file_name, raw, usecols=lambda name: name in self.columns): #older captures lack some timing columns
+            with profiler.stage('aggregate timing', file_name, rows=len(chunk)):
+                totals.add(chunk)
+                timing.add(chunk)
+        totals.fill(data_obj, self.budget)
+        timing.fill(data_obj)
+        return data_obj
+
+def _percentiles(first, counts, quantiles):
+    '''
+    Smallest value at or below which a fraction q of the counted values lie,
+    for each q in quantiles, i.e. the inverted CDF of the histogram.
+    '''
+    cumulative = np.cumsum(counts)
+    if len(cumulative) == 0 or cumulative[-1] == 0:
+        return np.full(len(quantiles), np.nan)
+    idx = np.searchsorted(cumulative, np.asarray(quantiles)*cumulative[-1], side='left')
+    return first + np.minimum(idx, len(counts)-1).astype(float)
+
+def timing_table(*data_obj, quantity='t1', by=('rf_mode', 'T1', 'BLF', 'rx_pow'), quantiles=(.01, .5, .99)):
+    '''
+    Distribution of a timing quantity per group of sweeps and power levels,
+    merging the histograms and sums of the group.
+
+    parameters
+    ----------
+
+    data_obj: timing_data
+        As read by timing_reader, or a sweep_collection of them
+
+    quantity: str
+        One of TIMING_QUANTITIES
+
+    by: list of str
+        Columns to group by, from name_of_file, rf_mode, T1, BLF, freq_mhz
+        and rx_pow.  Leaving out rx_pow gives the distribution of a setting
+        over all power levels.
+
+    quantiles: list of float
+        Fractions in [0, 1] of the percentiles given
+
+    return
+    ------
+
+    DataFrame indexed by the by columns with columns n, mean, std, min, one
+    column p<100*q> per quantile, max, corr_n_bit_err, the Pearson
+    correlation of the quantity with n_bit_err (NaN if either is constant),
+    and n_under and n_over, the values outside TIMING_RANGES left out of the
+    others
+    '''
+    data_obj = as_sweeps(data_obj)
+    q = list(TIMING_QUANTITIES).index(quantity)
+    codes, keys, sweep, level = _level_groups(data_obj, by)
+    moments = np.concatenate([each_data.timing_moments[:, q] for each_data in data_obj] + [np.zeros((0, len(MOMENTS)))])
+    sums = np.stack([np.bincount(codes, weights=moments[:, m], minlength=len(keys)) for m in range(len(MOMENTS))], axis=1)
+    n, sx, sxx, sy, syy, sxy = sums.T
+    outside = np.concatenate([each_data.timing_outside[:, q] for each_data in data_obj] + [np.zeros((0, 2), dtype=np.int64)])
+    n_under, n_over = [np.bincount(codes, weights=outside[:, k], minlength=len(keys)).astype(np.int64) for k in range(2)]
+
+    merged = [rssi_histogram() for _ in keys]
+    for code, each_sweep, each_level in zip(codes, sweep, level):
+        hist = data_obj[each_sweep].timing_hists[quantity][each_level]
+        merged[code].add_counts(hist.first, hist.counts)
+    percentiles = np.array([_percentiles(hist.first, hist.counts, [0.] + list(quantiles) + [1.]) for hist in merged]).reshape(len(keys), len(quantiles)+2)
+
+    with np.errstate(divide='ignore', invalid='ignore'): #empty groups and constant quantities
+        mean = sx/n
+        var_x = sxx/n - mean**2
+        var_y = syy/n - (sy/n)**2
+        corr = (sxy/n - mean*sy/n)/np.sqrt(var_x*var_y)
+        std = np.sqrt(np.maximum(var_x, 0)*n/(n-1))
+
+    table = pd.DataFrame({'n': n.astype(np.int64), 'mean': mean, 'std': std, 'min': percentiles[:, 0]}, index=keys)
+    for k, each_q in enumerate(quantiles):
+        table[f'p{100*each_q:g}'] = percentiles[:, k+1]
+    table['max'] = percentiles[:, -1]
+    table['corr_n_bit_err'] = np.clip(corr, -1., 1.) #rounding can carry it just past 1
+    table['n_under'] = n_under
+    table['n_over'] = n_over
+    return table.sort_index()
+
+def t1_table(*data_obj, quantiles=(.01, .5, .99)):
+    '''
+    T1 turnaround distribution of each RF mode and T1 setting, over all BLF
+    errors and power levels, followed by the same per attenuation step.
+    Returns (per setting, per power level) tables as from timing_table.
+    '''
+    return (timing_table(*data_obj, quantity='t1', by=['rf_mode', 'T1'], quantiles=quantiles),
+            timing_table(*data_obj, quantity='t1', by=['rf_mode', 'T1', 'rx_pow'], quantiles=quantiles))
+
+if __name__ == '__main__':
+    pd.set_option('display.width', 200)
+    per_setting, per_pow = t1_table(*timing_reader('test_data').read())
+    print(per_setting)
+    print(per_pow)
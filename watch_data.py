@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Watches a data folder while a sweep is running and keeps the sensitivity
+and RSSI check results up to date as CSV files land or grow.
+
+Only the bytes added to a file since the last look are parsed, so results
+follow the test rig within one polling interval.
+"""
+import io
+import os
+import time
+import warnings
+import pandas as pd
+from summarize_data import CSV_DTYPES, COLUMN_PROFILES, HEADER_COLUMNS, ber_data, ber_accumulator, _check_rssi_one, check_rssi_brief
+from sensitivity_comp import _sensitivity_batch, sens_disp
+from link_budget import DEFAULT_BUDGET
+
+TAIL_BYTES = 256 #bytes before the end of what was read compared to tell appends from rewrites
+
+class _file_state:
+    '''
+    What has been read of one CSV file so far.
+    '''
+    def __init__(self, file_name, field_names, header_line, stat):
+        self.data_obj = ber_data(file_name)
+        self.totals = ber_accumulator()
+        self.field_names = field_names
+        self.header_line = header_line #bytes of the field names line
+        self.offset = len(header_line) #bytes read so far, always at the start of a line
+        self.tail = b'' #last bytes read, up to offset
+        self.inode = stat.st_ino
+        self.mtime_ns = stat.st_mtime_ns #of the file when last read
+        self.has_header = False #test settings are known once the first row is read
+
+    def rewritten(self, csv_file, stat):
+        '''
+        Whether the file was replaced or rewritten since it was last read,
+        rather than only appended to: it is a different file, it shrank, or
+        the field names or the bytes just before offset changed.
+        '''
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            return True
+        if csv_file.read(len(self.header_line)) != self.header_line:
+            return True
+        csv_file.seek(self.offset - len(self.tail))
+        return csv_file.read(len(self.tail)) != self.tail
+
+class ber_data_watcher:
+    '''
+    Keeps ber_data objects, sensitivities and RSSI checks of a folder up to
+    date by reading only the CSV files, or the rows of a file, that are new
+    since the previous update.
+    '''
+    def __init__(self, folder_name, columns='rssi', targets=(1.e-3, 1.e-4), block_bytes=2**26, budget=DEFAULT_BUDGET):
+        '''
+        folder_name: str
+            Folder the test rig writes the CSV files to.
+
+        columns: str or list
+            Column profile as in ber_data_reader.  The RSSI checks need 'rssi'.
+
+        targets: list of float
+            BER of each sensitivity point.
+
+        block_bytes: int
+            Most bytes of a file parsed at a time, which bounds memory when a
+            large file is first seen.
+
+        budget: link_budget
+            Power level of each attenuation step, as in ber_data_reader.
+        '''
+        self.folder_name = folder_name
+        self.columns = COLUMN_PROFILES[columns] if isinstance(columns, str) else list(columns)
+        self.targets = list(targets)
+        self.block_bytes = block_bytes
+        self.budget = budget
+        self.files = dict() #file name -> _file_state
+        self.sens_dict = {'targets': self.targets} #as returned by sensitivities
+        self.rssi_checks = dict() #file name -> result of _check_rssi_one
+        self.read_errors = dict() #file name -> error message of the files that failed to parse at the last update
+
+    @property
+    def data(self):
+        '''
+        ber_data objects of all files read so far, in order of file name.
+        '''
+        return [self.files[file_name].data_obj for file_name in sorted(self.files) if self.files[file_name].has_header]
+
+    def update(self):
+        '''
+        Reads what is new in the folder and updates the results of the files
+        that changed.  Returns the ber_data objects of those files.
+        
+        A file that fails to parse is reported with a warning and recorded in
+        read_errors, and read again from the start at the next update, so
+        one bad file does not stop the others or the watch.  The results of
+        files removed from the folder are dropped.
+        '''
+        files = sorted(file_name for file_name in next(os.walk(self.folder_name))[2] if '.csv' in file_name)
+        for file_name in set(self.files) - set(files):
+            self._forget(file_name)
+        for file_name in set(self.read_errors) - set(files):
+            del self.read_errors[file_name]
+
+        changed = []
+        for file_name in files:
+            try:
+                if self._ingest(file_name):
+                    changed += [self.files[file_name].data_obj]
+                self.read_errors.pop(file_name, None)
+            except Exception as err:
+                self._forget(file_name)
+                error = f'{type(err).__name__}: {err}'
+                if self.read_errors.get(file_name) != error: #warn once per error, not on every poll
+                    warnings.warn(f'Could not read {file_name}: {error}')
+                self.read_errors[file_name] = error
+
+        if changed:
+            for data_obj, sens in zip(changed, _sensitivity_batch(changed, self.targets)):
+                self.sens_dict.setdefault(data_obj.rf_mode, {})
+                self.sens_dict[data_obj.rf_mode][data_obj.t1_time+'_'+data_obj.blf_err] = tuple(sens)
+            for data_obj in changed:
+                if len(data_obj.rx_pow) > 1 and len(data_obj.t1_rssi_hists): #a line needs two power levels
+                    self.rssi_checks[data_obj.name_of_file] = _check_rssi_one(data_obj)
+
+        return changed
+
+    def _forget(self, file_name):
+        '''
+        Drops what was read of file_name and its results, before it is read
+        again from the start or after it was removed.  Its sensitivities are
+        kept while another file has the same settings.
+        '''
+        state = self.files.pop(file_name, None)
+        self.rssi_checks.pop(file_name, None)
+        if state is None or not state.has_header:
+            return
+        data_obj = state.data_obj
+        setting = (data_obj.rf_mode, data_obj.t1_time+'_'+data_obj.blf_err)
+        if any((each.rf_mode, each.t1_time+'_'+each.blf_err) == setting for each in self.data):
+            return
+        mode_dict = self.sens_dict.get(data_obj.rf_mode, {})
+        mode_dict.pop(setting[1], None)
+        if not mode_dict:
+            self.sens_dict.pop(data_obj.rf_mode, None)
+
+    def watch(self, poll_s=2., callback=None):
+        '''
+        Calls update every poll_s seconds until interrupted, passing the
+        watcher and the changed ber_data objects to callback after each update
+        that found something new.  By default the changes are printed.
+        '''
+        callback = report_changes if callback is None else callback
+        try:
+            while True:
+                changed = self.update()
+                if changed:
+                    callback(self, changed)
+                time.sleep(poll_s)
+        except KeyboardInterrupt:
+            pass
+
+    def _ingest(self, file_name):
+        '''
+        Parses the complete rows added to file_name since the last update.
+        Returns True if any rows were added.
+        '''
+        file_path = self.folder_name+"/"+ file_name
+        state = self.files.get(file_name)
+
+        with open(file_path, 'rb') as csv_file:
+            stat = os.fstat(csv_file.fileno())
+            size = stat.st_size
+            if state is not None and stat.st_mtime_ns == state.mtime_ns and size == state.offset:
+                return False
+            if state is not None and state.rewritten(csv_file, stat): #start over
+                self._forget(file_name)
+                state = None
+            if state is not None and size == state.offset:
+                state.mtime_ns = stat.st_mtime_ns
+                return False
+
+            if state is None:
+                csv_file.seek(0)
+                header_line = csv_file.readline()
+                if not header_line.endswith(b'\n'): #field names still being written
+                    return False
+                state = _file_state(file_name, list(pd.read_csv(io.BytesIO(header_line), nrows=0).columns), header_line, stat)
+                self.files[file_name] = state
+
+            state.mtime_ns = stat.st_mtime_ns
+            csv_file.seek(state.offset)
+            n_rows = 0
+            while state.offset < size:
+                block = csv_file.read(min(self.block_bytes, size - state.offset))
+                end = block.rfind(b'\n') + 1 #leave a partly written last row for the next update
+                if end == 0:
+                    break
+                n_rows += self._add_rows(state, block[:end])
+                state.offset += end
+                state.tail = block[max(end - TAIL_BYTES, 0):end]
+                csv_file.seek(state.offset)
+
+        if n_rows and state.has_header:
+            state.totals.fill(state.data_obj, self.budget)
+        return n_rows > 0 and state.has_header
+
+    def _add_rows(self, state, rows):
+        '''
+        Adds the bytes of complete CSV rows to the totals of state, reading
+        the test settings from the first row of the file.
+        '''
+        if self.columns is None:
+            usecols = None
+        else:
+            usecols = self.columns if state.has_header else self.columns + HEADER_COLUMNS
+        chunk = pd.read_csv(io.BytesIO(rows), header=None, names=state.field_names, dtype=CSV_DTYPES, usecols=usecols)
+
+        if not state.has_header and len(chunk):
+            state.data_obj.fill_header(chunk[HEADER_COLUMNS])
+            state.has_header = True
+
+        state.totals.add(chunk)
+        return len(chunk)
+
+def report_changes(watcher, changed):
+    '''
+    Prints the sensitivities and brief RSSI checks of the changed sweeps.
+    '''
+    print(f'{time.strftime("%H:%M:%S")}: {len(changed)} updated of {len(watcher.files)} files')
+    sens_changed = {'targets': watcher.targets}
+    for data_obj in changed:
+        sens_changed.setdefault(data_obj.rf_mode, {})
+        sens_changed[data_obj.rf_mode][data_obj.t1_time+'_'+data_obj.blf_err] = watcher.sens_dict[data_obj.rf_mode][data_obj.t1_time+'_'+data_obj.blf_err]
+    sens_disp(sens_changed)
+    check_rssi_brief(*[data_obj for data_obj in changed if data_obj.name_of_file in watcher.rssi_checks])
+
+if __name__ == '__main__':
+    ber_data_watcher('test_data').watch()
@@ -8,7 +8,9 @@ Writes the results of a comparison to Excel.
 """
 
 import openpyxl
-import copy
+import numpy as np
+from sensitivity_comp import target_label
+from instrument import timed
 
 class write_excel:
     
@@ -20,7 +22,8 @@ class write_excel:
             Name of Excel file to write to.
         data_dict : dictionary
             A dictionary containing the data to write to the Excel file.
-            Dictionary shall contain: {'names':[name1, name2], mode_id:{t1_blf:{'T1': t1, 'BLF': blf, 'name1':[1e3, 1e4], 'name2':[1e3, 1e4], 'delta':[1e3, 1e4]}}}
+            Dictionary shall contain: {'names':[name1, name2], 'targets':[1e-3, 1e-4, ...], mode_id:{t1_blf:{'T1': t1, 'BLF': blf, 'name1':[1e3, 1e4, ...], 'name2':[1e3, 1e4, ...], 'delta':[1e3, 1e4, ...]}}}
+            as returned by sens_comp, with one sensitivity per target.  'targets' defaults to [1e-3, 1e-4].
             
         Returns
         -------
@@ -28,50 +31,48 @@ class write_excel:
 
         """
         self.name_of_excel_file = name_of_excel_file_without_xlsx+'.xlsx' #adds extension for you
-        self.wb = openpyxl.Workbook()
+        self.wb = openpyxl.Workbook(write_only=True) #rows are streamed to the file rather than kept as cell objects
         self.data_dict = data_dict.copy()
 
+    @timed('write Excel')
     def write_modes(self):
         """
-        Writes the current sheet with data of all modes in data_dict
+        Writes a summary sheet with one row per mode, T1, BLF and target,
+        followed by one sheet per mode in data_dict.  Rows are appended whole,
+        so the time taken grows linearly with the number of settings.
         """
 
-        name1, name2 = self.data_dict['names']
-        self.data_dict.pop('names', None)
+        name1, name2 = self.data_dict.pop('names')
+        targets = self.data_dict.pop('targets', [1.e-3, 1.e-4])
+        labels = [target_label(target) for target in targets]
         
+        summary = self.wb.create_sheet(title='summary')
+        summary.append(['mode', 'T1', 'BLF', 'target', name1, name2, 'delta'])
         for mode_id in self.data_dict.keys():
+            for setting in self.data_dict[mode_id].values():
+                for k, label in enumerate(labels):
+                    summary.append([mode_id, setting['T1'], setting['BLF'], label,
+                                    *[_cell_value(setting[key][k]) for key in ['name1', 'name2', 'delta']]])
         
-            # create a sheet
-            self.wb.create_sheet(title='mode '+str(mode_id))
-            sheet = self.wb.get_sheet_by_name('mode '+str(mode_id))
+        for mode_id in self.data_dict.keys():
+            sheet = self.wb.create_sheet(title='mode '+str(mode_id))
             
-            first_row = 1
-
-            for t1_blf in self.data_dict[mode_id].keys():
-                sheet['A'+str(first_row)] = 'T1'; sheet['B'+str(first_row)] = self.data_dict[mode_id][t1_blf]['T1']
-                
-                sheet['A'+str(first_row+1)] = 'BLF'; sheet['B'+str(first_row+1)] = self.data_dict[mode_id][t1_blf]['BLF']
-                
-                sheet['A'+str(first_row+2)] = 'sensitivity'; sheet['B'+str(first_row+2)] = '1.e-3'; sheet['C'+str(first_row+2)] = '1.e-4'
-                
-                sheet['A'+str(first_row+3)] = name1
-                sheet['B'+str(first_row+3)] = self.data_dict[mode_id][t1_blf]['name1'][0]
-                sheet['C'+str(first_row+3)] = self.data_dict[mode_id][t1_blf]['name1'][1]
-    
-                sheet['A'+str(first_row+4)] = name2
-                sheet['B'+str(first_row+4)] = self.data_dict[mode_id][t1_blf]['name2'][0]
-                sheet['C'+str(first_row+4)] = self.data_dict[mode_id][t1_blf]['name2'][1]        
-    
-                sheet['A'+str(first_row+5)] = 'delta'
-                sheet['B'+str(first_row+5)] = self.data_dict[mode_id][t1_blf]['delta'][0]
-                sheet['C'+str(first_row+5)] = self.data_dict[mode_id][t1_blf]['delta'][1]
-                first_row += 7 
+            for setting in self.data_dict[mode_id].values(): #blocks of 7 rows, one per T1 and BLF setting
+                sheet.append(['T1', setting['T1']])
+                sheet.append(['BLF', setting['BLF']])
+                sheet.append(['sensitivity', *labels]) #one column per target from column B on
+                sheet.append([name1, *[_cell_value(value) for value in setting['name1']]])
+                sheet.append([name2, *[_cell_value(value) for value in setting['name2']]])
+                sheet.append(['delta', *[_cell_value(value) for value in setting['delta']]])
+                sheet.append([])
         
-        self.wb.remove_sheet(self.wb.get_sheet_by_name('Sheet')) #remove the first sheet, as it's blank
         self.write_file()
         
     def write_file(self):
         """
         Write the Excel file.
         """
-        self.wb.save(self.name_of_excel_file)
\ No newline at end of file
+        self.wb.save(self.name_of_excel_file)
+
+def _cell_value(value):
+    return '---' if np.isnan(value) else float(value) #target not reached